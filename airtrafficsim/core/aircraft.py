@@ -1,17 +1,65 @@
+import logging
+import math
 import numpy as np
 
 from airtrafficsim.core.traffic import Traffic
 from airtrafficsim.core.navigation import Nav
-from airtrafficsim.utils.unit_conversion import Unit
-from airtrafficsim.utils.calculation import Cal
 from airtrafficsim.utils.enums import APLateralMode, APThrottleMode
 
+logger = logging.getLogger(__name__)
+
+_LM_HEADING = APLateralMode.HEADING.value
+_LM_LNAV = APLateralMode.LNAV.value
+_AT_SPEED = APThrottleMode.SPEED.value
+_AT_AUTO = APThrottleMode.AUTO.value
+
+KTS_TO_MPS = 0.514444444
+"""Knots to m/s, same factor as Unit.kts2mps()"""
+
+
+def _cal_dest_given_dist_bearing(lat, long, bearing, dist):
+    """
+    Scalar version of Cal.cal_dest_given_dist_bearing() using the math module to avoid NumPy dispatch on single values.
+
+    Parameters
+    ----------
+    lat : float
+        Latitude of start point [deg]
+    long : float
+        Longitude of start point [deg]
+    bearing : float
+        Target bearing [deg 0-360]
+    dist : float
+        Target distance [km]
+
+    Returns
+    -------
+    lat2 : float
+        Latitude of destination [deg]
+    long2 : float
+        Longitude of destination [deg]
+    """
+    lat = math.radians(lat)
+    bearing = math.radians(bearing)
+    angular_dist = dist / 6371.009
+    lat2 = math.asin(math.sin(lat) * math.cos(angular_dist) +
+                     math.cos(lat) * math.sin(angular_dist) * math.cos(bearing))
+    long2 = long + math.degrees(math.atan2(math.sin(bearing) * math.sin(angular_dist) * math.cos(lat),
+                                           math.cos(angular_dist) - math.sin(lat) * math.sin(lat2)))
+    return math.degrees(lat2), (long2 + 540.0) % 360.0 - 180.0
+
 
 class Aircraft:
     """
     Aircraft class to represent the states of one individual aircraft, including get and set functions.
+
+    Autopilot commands (heading, speed, vertical speed, altimeter and navigation mode) are queued in the traffic array
+    and applied together at the start of the next Traffic.update().
+    The get functions read one aircraft at a time. Use Traffic.snapshot() to read the state of all aircraft at once.
     """
 
+    __slots__ = ("traffic", "index", "vectoring", "_row_cache", "_row_version")
+
     def __init__(self, traffic: Traffic, callsign, aircraft_type, flight_phase, configuration, lat, long, alt, heading, cas, fuel_weight, payload_weight, departure_airport="", departure_runway="", sid="", arrival_airport="", arrival_runway="", star="", approach="", flight_plan=[], flight_plan_index=0, cruise_alt=-1, initial_frequency=""):
         """
         Initialize one aircraft and add the aircraft to traffic array.
@@ -67,8 +115,37 @@ class Aircraft:
         self.index = self.traffic.add_aircraft(callsign, aircraft_type, flight_phase, configuration, lat, long, alt, heading, cas, fuel_weight, payload_weight,
                                                departure_airport, departure_runway, sid, arrival_airport, arrival_runway, star, approach, flight_plan, flight_plan_index,
                                                cruise_alt, initial_frequency)        # Add aircraft. Obtain aircraft index
+        self._row_cache = len(self.traffic.index) - 1         # Row of the aircraft in traffic array
+        self._row_version = self.traffic._version             # Traffic array version when the row was resolved
         self.vectoring = ""
 
+    def _row(self):
+        """
+        Get the row of the aircraft in the traffic array.
+
+        Returns
+        -------
+        row : int
+            Row index of the aircraft
+
+        Notes
+        -----
+        The row is cached and only resolved again when the traffic array is compacted by Traffic.del_aircraft().
+        Traffic.find_row() is a binary search on the ascending Traffic.index array.
+
+        Raises
+        ------
+        KeyError
+            If the aircraft has been deleted from the traffic array
+        """
+        if self._row_version != self.traffic._version:
+            row = self.traffic.find_row(self.index)
+            if row < 0:
+                raise KeyError(f"Aircraft {self.index} is not in the traffic array")
+            self._row_cache = row
+            self._row_version = self.traffic._version
+        return self._row_cache
+
     def set_heading(self, heading):
         """
         Set the heading of the aircraft.
@@ -78,9 +155,13 @@ class Aircraft:
         heading : float
             Heading [deg]
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
-        self.traffic.ap.heading[index] = heading
-        self.traffic.ap.lateral_mode[index] = APLateralMode.HEADING
+        traffic = self.traffic
+        index = self._row()
+        if traffic.get_command(('ap', 'heading'), index) == heading and \
+                traffic.get_command(('ap', 'lateral_mode'), index) == _LM_HEADING:
+            return
+        traffic.queue_command(('ap', 'heading'), index, heading)
+        traffic.queue_command(('ap', 'lateral_mode'), index, _LM_HEADING)
 
     def set_speed(self, speed):
         """
@@ -91,9 +172,13 @@ class Aircraft:
         speed : float
             Speed [kt]
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
-        self.traffic.ap.cas[index] = speed
-        self.traffic.ap.auto_throttle_mode[index] = APThrottleMode.SPEED
+        traffic = self.traffic
+        index = self._row()
+        if traffic.get_command(('ap', 'cas'), index) == speed and \
+                traffic.get_command(('ap', 'auto_throttle_mode'), index) == _AT_SPEED:
+            return
+        traffic.queue_command(('ap', 'cas'), index, speed)
+        traffic.queue_command(('ap', 'auto_throttle_mode'), index, _AT_SPEED)
 
     # def set_mach(self, mach):
     #     """Set Mach [dimensionless]"""
@@ -108,8 +193,10 @@ class Aircraft:
         vs : float
             Vertical speed [ft/min]
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
-        self.traffic.ap.vs[index] = vs
+        index = self._row()
+        if self.traffic.get_command(('ap', 'vs'), index) == vs:
+            return
+        self.traffic.queue_command(('ap', 'vs'), index, vs)
 
     def set_alt(self, alt):
         """
@@ -120,10 +207,7 @@ class Aircraft:
         alt : float
             Altitude [ft]
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
-        flight_plan_index = self.traffic.ap.flight_plan_index[index]
-        self.traffic.ap.flight_plan_target_alt[index][flight_plan_index] = alt
-        self.traffic.ap.alt[index] = alt
+        self.traffic.ap.set_target_alt(self._row(), alt)
 
     def set_direct(self, waypoint):
         """
@@ -134,8 +218,8 @@ class Aircraft:
         waypoint : str
             ICAO code of the waypoint
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
-        self.traffic.ap.lateral_mode[index] = APLateralMode.LNAV
+        index = self._row()
+        self.traffic.queue_command(('ap', 'lateral_mode'), index, _LM_LNAV)
 
     def set_holding(self, holding_time, holding_fix, region):
         """
@@ -150,10 +234,7 @@ class Aircraft:
         region : float
             ICAO code of the region that the aircraft should hold
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
-        self.traffic.ap.holding_round[index] = holding_time
-        self.traffic.ap.holding_info[index] = Nav.get_holding_procedure(
-            holding_fix, region)
+        self.traffic.ap.set_holding(self._row(), holding_time, Nav.get_holding_procedure(holding_fix, region))
 
     def set_vectoring(self, vectoring_time, v_2, fix):
         """
@@ -170,29 +251,25 @@ class Aircraft:
         """
         if not self.vectoring == fix and self.get_next_wp() == fix:
             self.vectoring = fix
-            index = np.where(self.traffic.index == self.index)[0][0]
+            traffic = self.traffic
+            ap = traffic.ap
+            traffic.flush_commands()   # Use commanded heading
+            index = self._row()
 
-            new_dist = self.traffic.ap.dist[index] + Unit.kts2mps(
-                self.traffic.cas[index] + v_2) * (vectoring_time) / 2000.0
-            bearing = np.mod(self.traffic.ap.heading[index]+np.rad2deg(
-                np.arccos(self.traffic.ap.dist[index]/new_dist)) + 360.0, 360.0)
-            lat, long = Cal.cal_dest_given_dist_bearing(
-                self.traffic.lat[index], self.traffic.long[index], bearing, new_dist / 2)
+            new_dist = ap.dist[index] + (traffic.cas[index] + v_2) * KTS_TO_MPS * vectoring_time / 2000.0
+            bearing = (ap.heading[index] + math.degrees(math.acos(ap.dist[index]/new_dist)) + 360.0) % 360.0
+            lat, long = _cal_dest_given_dist_bearing(traffic.lat[index], traffic.long[index], bearing, new_dist / 2)
 
             # Add new virtual waypoint
-            i = self.traffic.ap.flight_plan_index[index]
-            self.traffic.ap.flight_plan_lat[index].insert(i, lat)
-            self.traffic.ap.flight_plan_long[index].insert(i, long)
-            self.traffic.ap.flight_plan_name[index].insert(i, "VECT")
-            self.traffic.ap.flight_plan_target_alt[index].insert(
-                i, self.traffic.ap.flight_plan_target_alt[index][i])
-            self.traffic.ap.flight_plan_target_speed[index][i] = v_2
-            self.traffic.ap.flight_plan_target_speed[index].insert(
-                i, self.traffic.ap.flight_plan_target_speed[index][i])
+            i = ap.flight_plan_index[index]
+            ap.insert_waypoint(index, i, "VECT", lat, long, ap.flight_plan_target_alt[index, i], v_2)
+            ap.flight_plan_target_speed[index, i+1] = v_2     # Fly to the fix at vectoring speed as well
 
     def set_altimeter(self, altimeter):
-        index = np.where(self.traffic.index == self.index)[0][0]
-        self.traffic.altimeter[index] = altimeter
+        index = self._row()
+        if self.traffic.get_command(('altimeter',), index) == altimeter:
+            return
+        self.traffic.queue_command(('altimeter',), index, altimeter)
 
     def set_flight_plan(self, arrival_airport=None, arrival_runway=None, star=None, approach=None, flight_plan=None, flight_plan_index=None, cruise_alt=None):
         """
@@ -203,37 +280,39 @@ class Aircraft:
         flight_plan : String[]
             Flight plan of an aircraft
         """
-        print(f"Set flight plan: {arrival_airport}, {arrival_runway}, {star}, {approach}, {flight_plan}, {cruise_alt}")
-
-        index = np.where(self.traffic.index == self.index)[0][0]
-        self.traffic.ap.set_flight_plan(
-            index,
-            departure_airport=self.traffic.ap.departure_airport[index],
-            departure_runway=self.traffic.ap.departure_runway[index],
-            sid=self.traffic.ap.sid[index],
-            arrival_airport=self.traffic.ap.arrival_airport[index] if arrival_airport is None else arrival_airport,
-            arrival_runway=self.traffic.ap.arrival_runway[index] if arrival_runway is None else arrival_runway,
-            star=self.traffic.ap.star[index] if star is None else star,
-            approach=self.traffic.ap.approach[index] if approach is None else approach,
-            flight_plan=self.traffic.ap.flight_plan_enroute[index] if flight_plan is None else flight_plan,
-            flight_plan_index=self.traffic.ap.flight_plan_index[index] if flight_plan_index is None else flight_plan_index,
-            cruise_alt=self.traffic.ap.cruise_alt[index] if cruise_alt is None else cruise_alt
-        )
+        logger.debug("Set flight plan: %s, %s, %s, %s, %s, %s", arrival_airport, arrival_runway, star, approach, flight_plan, cruise_alt)
+
+        self.traffic.flush_commands()   # Flight plan overrides queued lateral and throttle mode
+        ap = self.traffic.ap
+        index = self._row()
+        flight_plan_args = {'departure_airport': ap.departure_airport[index],
+                            'departure_runway': ap.departure_runway[index],
+                            'sid': ap.sid[index]}
+        for key, value, current in (('arrival_airport', arrival_airport, ap.arrival_airport),
+                                    ('arrival_runway', arrival_runway, ap.arrival_runway),
+                                    ('star', star, ap.star),
+                                    ('approach', approach, ap.approach),
+                                    ('flight_plan', flight_plan, ap.flight_plan_enroute),
+                                    ('flight_plan_index', flight_plan_index, ap.flight_plan_index),
+                                    ('cruise_alt', cruise_alt, ap.cruise_alt)):
+            flight_plan_args[key] = current[index] if value is None else value
+        ap.set_flight_plan(index, **flight_plan_args)
 
     def set_flight_phase(self, flight_phase):
         """
         Set flight phase.
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
+        index = self._row()
         self.traffic.flight_phase[index] = flight_phase
 
     def resume_own_navigation(self):
         """
         Resume own navigation to use autopilot instead of user commanded target.
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
-        self.traffic.ap.lateral_mode[index] = APLateralMode.LNAV
-        self.traffic.ap.auto_throttle_mode[index] = APThrottleMode.AUTO
+        traffic = self.traffic
+        index = self._row()
+        traffic.queue_command(('ap', 'lateral_mode'), index, _LM_LNAV)
+        traffic.queue_command(('ap', 'auto_throttle_mode'), index, _AT_AUTO)
 
     def get_heading(self):
         """
@@ -244,7 +323,7 @@ class Aircraft:
         Heading : float
             Heading [deg]
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
+        index = self._row()
         return self.traffic.heading[index]
 
     def get_cas(self):
@@ -256,7 +335,7 @@ class Aircraft:
         cas : float
             Calibrated air speed [knots]
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
+        index = self._row()
         return self.traffic.cas[index]
 
     def get_mach(self):
@@ -268,7 +347,7 @@ class Aircraft:
         mach : float
             Mach number [dimensionless]
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
+        index = self._row()
         return self.traffic.mach[index]
 
     def get_vs(self):
@@ -280,7 +359,7 @@ class Aircraft:
         vs : float
             Vertical speed [ft/min]
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
+        index = self._row()
         return self.traffic.vs[index]
 
     def get_alt(self):
@@ -292,7 +371,7 @@ class Aircraft:
         alt : float[]
             Altitude [ft]
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
+        index = self._row()
         return self.traffic.alt[index]
 
     def get_long(self):
@@ -304,7 +383,7 @@ class Aircraft:
         long : float
             Longitude [deg]
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
+        index = self._row()
         return self.traffic.long[index]
 
     def get_lat(self):
@@ -316,7 +395,7 @@ class Aircraft:
         lat : float
             Latitude [deg]
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
+        index = self._row()
         return self.traffic.lat[index]
 
     def get_fuel_consumed(self):
@@ -328,7 +407,7 @@ class Aircraft:
         fuel_consumed : float
             Fuel consumed [kg]
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
+        index = self._row()
         return self.traffic.fuel_consumed[index]
 
     def get_next_wp(self):
@@ -340,12 +419,11 @@ class Aircraft:
         waypoint : str
             ICAO code of the next waypoing
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
-
-        if self.traffic.ap.flight_plan_index[index] >= len(self.traffic.ap.flight_plan_name[index]):
-            return None
-
-        return self.traffic.ap.flight_plan_name[index][self.traffic.ap.flight_plan_index[index]]
+        ap = self.traffic.ap
+        index = self._row()
+        flight_plan_index = ap.flight_plan_index[index]
+        flight_plan_name = ap.flight_plan_name[index]
+        return flight_plan_name[flight_plan_index] if flight_plan_index < len(flight_plan_name) else None
 
     def get_wake(self):
         """
@@ -356,9 +434,10 @@ class Aircraft:
         Wake category : str
             The ICAO wake category of the aircraft.
         """
-        index = np.where(self.traffic.index == self.index)[0][0]
-        return self.traffic.perf.perf_model._Bada__wake_category[index]
+        return self.traffic.wake_category[self._row()]
 
     def set_frequency(self, frequency):
-        index = np.where(self.traffic.index == self.index)[0][0]
+        index = self._row()
+        if self.traffic.frequency[index] == frequency:
+            return
         self.traffic.frequency[index] = frequency
@@ -1,19 +1,128 @@
 from __future__ import annotations
 
+import logging
+import sys
 import numpy as np
 
 from airtrafficsim.core.navigation import Nav
 from airtrafficsim.utils.calculation import Cal
 from airtrafficsim.utils.enums import APSpeedMode, APThrottleMode, SpeedMode, VerticalMode, APLateralMode
 from airtrafficsim.utils.unit_conversion import Unit
-from airtrafficsim.utils.calculation import Cal
+
+logger = logging.getLogger(__name__)
+
+
+def _intern(names):
+    """
+    Intern waypoint names so that equal names share one string object.
+
+    Parameters
+    ----------
+    names : string[]
+        Waypoint names
+
+    Returns
+    -------
+    string[]
+        Interned waypoint names
+    """
+    return [sys.intern(str(name)) if isinstance(name, str) else name for name in names]
+
+
+class _Column:
+    """
+    Autopilot state array stored in a preallocated buffer.
+
+    Reading returns a view of the rows of the active aircraft. Assigning copies the values into the buffer, except for the
+    first assignment in Autopilot.__init__() which sets the (empty) buffer and its dtype. Columns with a field are views
+    of that field in the structured Autopilot._state_buf.
+    """
+
+    def __init__(self, field=None):
+        self.field = field
+
+    def __set_name__(self, owner, name):
+        if self.field is None:
+            self.buffer = '_' + name + '_buf'
+            owner._columns = owner.__dict__.get('_columns', ()) + (self.buffer,)
+        else:
+            self.buffer = '_state_buf'
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        array = getattr(obj, self.buffer)
+        if self.field is not None:
+            array = array[self.field]
+        return array[:obj._size]
+
+    def __set__(self, obj, value):
+        if self.buffer in obj.__dict__:
+            self.__get__(obj)[:] = value
+        else:
+            setattr(obj, self.buffer, value)
+
 
 class Autopilot:
     """
     Autopilot class
+
+    Numeric state arrays are views of buffers that grow by doubling, so adding and deleting aircraft does not reallocate
+    every array. The waypoint tracking state used together in update() is packed in one structured buffer.
     """
 
+    _STATE_DTYPE = np.dtype([('lat', 'f8'), ('long', 'f8'), ('lat_prev', 'f8'), ('long_prev', 'f8'), ('lat_next', 'f8'),
+                             ('long_next', 'f8'), ('lat_rad', 'f8'), ('lat_next_rad', 'f8'), ('dist', 'f8'), ('flight_plan_index', 'i8'), ('lateral_mode', 'i1'),
+                             ('hv_next_wp', '?'), ('auto_throttle_mode', 'i1')])
+    """Fields of the structured waypoint tracking buffer"""
+    _columns = ('_state_buf',)
+    """Names of the state buffers"""
+
+    alt = _Column()
+    heading = _Column()
+    track_angle = _Column()
+    ap_rate_of_turn = _Column()
+    cas = _Column()
+    mach = _Column()
+    vs = _Column()
+    fpa = _Column()
+    lat = _Column('lat')
+    long = _Column('long')
+    lat_next = _Column('lat_next')
+    long_next = _Column('long_next')
+    lat_prev = _Column('lat_prev')
+    long_prev = _Column('long_prev')
+    lat_rad = _Column('lat_rad')
+    lat_next_rad = _Column('lat_next_rad')
+    hv_next_wp = _Column('hv_next_wp')
+    dist = _Column('dist')
+    flight_plan_index = _Column('flight_plan_index')
+    flight_plan_len = _Column()
+    flight_plan_lat = _Column()
+    flight_plan_long = _Column()
+    flight_plan_lat_rad = _Column()
+    flight_plan_target_alt = _Column()
+    flight_plan_target_speed = _Column()
+    procedure_speed = _Column()
+    speed_mode = _Column()
+    auto_throttle_mode = _Column('auto_throttle_mode')
+    vertical_mode = _Column()
+    lateral_mode = _Column('lateral_mode')
+    expedite_descent = _Column()
+    cruise_alt = _Column()
+    holding = _Column()
+    holding_round = _Column()
+    holding_course = _Column()
+    holding_leg = _Column()
+
     def __init__(self):
+        self._size = 0
+        """Number of aircraft"""
+        self._capacity = 0
+        """Number of rows allocated in the state buffers"""
+        self._state_buf = np.zeros([0], dtype=self._STATE_DTYPE)
+        """Structured buffer of the waypoint tracking state"""
+
         # Target altitude
         self.alt = np.zeros([0])
         """Autopilot target altitude [feet]"""
@@ -51,6 +160,10 @@ class Autopilot:
         """Autopilot target latitude for previous waypoint [deg]"""
         self.long_prev = np.zeros([0])
         """Autopilot target longitude for previous waypoint [deg]"""
+        self.lat_rad = np.zeros([0])
+        """Autopilot target latitude [rad]"""
+        self.lat_next_rad = np.zeros([0])
+        """Autopilot target latitude for next waypoint [rad]"""
         self.hv_next_wp = np.ones([0], dtype=bool)
         """Autupilot hv next waypoint [bool]"""
         self.dist = np.zeros([0])
@@ -63,25 +176,31 @@ class Autopilot:
         """Flight plan for enroute navigation [[string]]"""
         self.flight_plan_name = []
         """2D array to store the string of waypoints [[string]]"""
-        self.flight_plan_lat = []
-        """2D array to store the latitude of waypoints [[deg...]]"""
-        self.flight_plan_long = []
-        """2D array to store the longitude of waypoints [[deg...]]"""
-        self.flight_plan_target_alt = []
-        """2D array of target altitude at each waypoint [[ft...]]"""
-        self.flight_plan_target_speed = []
-        """2D array of target speed at each waypoint [[cas/mach...]]"""
+        self._flight_plan_name_index = []
+        """Position of the first occurrence of each waypoint name in flight plan [{string: int}]"""
+        self.flight_plan_len = np.zeros([0], dtype=int)
+        """Number of waypoints in flight plan [int]"""
+        self.flight_plan_lat = np.zeros([0, 0])
+        """2D array to store the latitude of waypoints, padded with NaN after flight_plan_len [[deg...]]"""
+        self.flight_plan_long = np.zeros([0, 0])
+        """2D array to store the longitude of waypoints, padded with NaN after flight_plan_len [[deg...]]"""
+        self.flight_plan_lat_rad = np.zeros([0, 0])
+        """2D array to store the latitude of waypoints in radians, padded with NaN after flight_plan_len [[rad...]]"""
+        self.flight_plan_target_alt = np.zeros([0, 0])
+        """2D array of target altitude at each waypoint, NaN for waypoints without altitude target and after flight_plan_len [[ft...]]"""
+        self.flight_plan_target_speed = np.zeros([0, 0])
+        """2D array of target speed at each waypoint, padded with NaN after flight_plan_len [[cas/mach...]]"""
         self.procedure_speed = np.zeros([0])
         """Procedural target speed from BADA"""
 
         # Flight mode
-        self.speed_mode = np.zeros([0])
+        self.speed_mode = np.zeros([0], dtype=np.int8)
         """Autopilot speed mode [1: constant Mach, 2: constant CAS, 3: accelerate, 4: decelerate]"""
-        self.auto_throttle_mode = np.zeros([0])
+        self.auto_throttle_mode = np.zeros([0], dtype=np.int8)
         """Autothrottle mode [1: Auto, 2: Speed]"""
-        self.vertical_mode = np.zeros([0])
+        self.vertical_mode = np.zeros([0], dtype=np.int8)
         """Autopilot vertical mode [1: alt hold, 2: vs mode, 3: flc mode (flight level change), 4. VNAV]"""
-        self.lateral_mode = np.zeros([0])
+        self.lateral_mode = np.zeros([0], dtype=np.int8)
         """Autopilot lateral mode [1: heading, 2: LNAV] ATC only use heading, LNAV -> track angle"""
         self.expedite_descent = np.zeros([0], dtype=bool)
         """Autopilot expedite climb setting [bool]"""
@@ -100,14 +219,20 @@ class Autopilot:
         """Standard terminal arrival procedure"""
         self.approach = []
         """Approach procedure"""
-        self.cruise_alt = []
+        self.cruise_alt = np.zeros([0])
+        """Cruise altitude of flight plan [ft]"""
 
-        self.flight_plan_updated = np.zeros([0], dtype=bool)
+        self._updated_rows = []
+        """Rows whose flight plan changed since the last update [int]"""
 
         # Holding
         self.holding = np.zeros([0], dtype=bool)
         self.holding_round = np.zeros([0])
         self.holding_info = []
+        self.holding_course = np.zeros([0])
+        """Inbound course of the holding procedure, NaN when not holding [deg]"""
+        self.holding_leg = np.zeros([0])
+        """Leg length of the holding procedure [km]"""
 
 
     def add_aircraft(self, lat, long, alt, heading, cas, departure_airport, departure_runway, sid, arrival_airport, arrival_runway, star, approach, flight_plan, flight_plan_index, cruise_alt):
@@ -133,39 +258,48 @@ class Autopilot:
             Flight plan of an aircraft
         """
 
-        self.alt = np.append(self.alt, alt)
-        self.heading = np.append(self.heading, heading)
-        self.track_angle = np.append(self.track_angle, heading)
-        self.ap_rate_of_turn = np.append(self.ap_rate_of_turn, 0.0)
-        self.cas = np.append(self.cas, cas)
-        self.mach = np.append(self.mach, 0.0)
-        self.vs = np.append(self.vs, 0.0)
-        self.fpa = np.append(self.fpa, 0.0)
-        self.lat = np.append(self.lat, lat)
-        self.long = np.append(self.long, long)
-        self.lat_next = np.append(self.lat_next, 0.0)
-        self.long_next = np.append(self.long_next, 0.0)
-        self.lat_prev = np.append(self.lat_prev, 0.0)
-        self.long_prev = np.append(self.long_prev, 0.0)
-        self.hv_next_wp = np.append(self.hv_next_wp, False)
-        self.dist = np.append(self.dist, 0.0)
-        self.flight_plan_index = np.append(self.flight_plan_index, 0)
+        self._ensure_capacity(self._size + 1)
+        self._size = self._size + 1
+
+        self.alt[-1] = alt
+        self.heading[-1] = heading
+        self.track_angle[-1] = heading
+        self.ap_rate_of_turn[-1] = 0.0
+        self.cas[-1] = cas
+        self.mach[-1] = 0.0
+        self.vs[-1] = 0.0
+        self.fpa[-1] = 0.0
+        self.lat[-1] = lat
+        self.long[-1] = long
+        self.lat_next[-1] = 0.0
+        self.long_next[-1] = 0.0
+        self.lat_prev[-1] = 0.0
+        self.long_prev[-1] = 0.0
+        self.lat_rad[-1] = np.deg2rad(lat)
+        self.lat_next_rad[-1] = 0.0
+        self.hv_next_wp[-1] = False
+        self.dist[-1] = 0.0
+        self.flight_plan_index[-1] = 0
         self.flight_plan_enroute.append([])
         self.flight_plan_name.append([])
-        self.flight_plan_lat.append([])
-        self.flight_plan_long.append([])
-        self.flight_plan_target_alt.append([])
-        self.flight_plan_target_speed.append([])
-        self.procedure_speed = np.append(self.procedure_speed, 0.0)
-        self.speed_mode = np.append(self.speed_mode, 0.0)
-        self.auto_throttle_mode = np.append(self.auto_throttle_mode, APThrottleMode.SPEED)
-        self.vertical_mode = np.append(self.vertical_mode, 0.0)
-        self.lateral_mode = np.append(self.lateral_mode, APLateralMode.HEADING)
-        self.expedite_descent = np.append(self.expedite_descent, False)
-        self.holding = np.append(self.holding, False)
-        self.holding_round = np.append(self.holding_round, 0.0)
+        self._flight_plan_name_index.append({})
+        self.flight_plan_len[-1] = 0
+        self.flight_plan_lat[-1] = np.nan
+        self.flight_plan_long[-1] = np.nan
+        self.flight_plan_lat_rad[-1] = np.nan
+        self.flight_plan_target_alt[-1] = np.nan
+        self.flight_plan_target_speed[-1] = np.nan
+        self.procedure_speed[-1] = 0.0
+        self.speed_mode[-1] = APSpeedMode.NONE
+        self.auto_throttle_mode[-1] = APThrottleMode.SPEED
+        self.vertical_mode[-1] = 0
+        self.lateral_mode[-1] = APLateralMode.HEADING
+        self.expedite_descent[-1] = False
+        self.holding[-1] = False
+        self.holding_round[-1] = 0.0
         self.holding_info.append([])
-
+        self.holding_course[-1] = np.nan
+        self.holding_leg[-1] = 0.0
         self.departure_airport.append(departure_airport)
         self.departure_runway.append(departure_runway)
         self.sid.append(sid)
@@ -173,16 +307,16 @@ class Autopilot:
         self.arrival_runway.append(arrival_runway)
         self.star.append(star)
         self.approach.append(approach)
-        self.cruise_alt.append(cruise_alt)
-        self.flight_plan_updated = np.append(self.flight_plan_updated, True)
+        self.cruise_alt[-1] = cruise_alt
 
         self.set_flight_plan(-1, departure_airport, departure_runway, sid, arrival_airport, arrival_runway, star, approach, flight_plan, flight_plan_index, cruise_alt)
 
 
     def set_flight_plan(self, index, departure_airport, departure_runway, sid, arrival_airport, arrival_runway, star, approach, flight_plan, flight_plan_index, cruise_alt):
-        print("Set flight plan original:", self.flight_plan_name[index])
+        logger.debug("Set flight plan original: %s", self.flight_plan_name[index])
 
         lat_dep, long_dep, alt_dep = Nav.get_runway_coord(departure_airport, departure_runway[2:])
+        arrival_runway_code = arrival_runway[2:]
 
         self.departure_airport[index] = departure_airport
         self.departure_runway[index] = departure_runway
@@ -194,122 +328,63 @@ class Autopilot:
         self.cruise_alt[index] = cruise_alt
 
         self.flight_plan_enroute[index] = flight_plan
-        self.flight_plan_name[index] = []
-        self.flight_plan_lat[index] = []
-        self.flight_plan_long[index] = []
-        self.flight_plan_target_alt[index] = []
-        self.flight_plan_target_speed[index] = []
+        flight_plan_name = []
+        self.flight_plan_name[index] = flight_plan_name
+        # Waypoint targets are collected in lists and stored in the 2D arrays at the end
+        flight_plan_target_alt = []
+        flight_plan_target_speed = []
 
         # Add 1 to account for origin
         self.flight_plan_index[index] = flight_plan_index + 1
-        self.flight_plan_updated[index] = True
+        self._updated_rows.append(index % self._size)
 
-        # if not flight_plan == []:
         # Add SID to flight plan
         if not sid == "":
             waypoint, alt_restriction_type, alt_restriction, speed_resctriction_type, speed_restriction = Nav.get_procedure(departure_airport, departure_runway, sid)
-            if len(waypoint) > 0:
-                # TODO: Ignored alt restriction 2, alt restriction type, and speed restriction type
-                self.flight_plan_name[index].extend(waypoint)
-                self.flight_plan_target_alt[index].extend(alt_restriction)
-                self.flight_plan_target_speed[index].extend(speed_restriction)
-
-                self.hv_next_wp[index] = True
-                self.lateral_mode[index] = APLateralMode.LNAV
-                self.auto_throttle_mode[index] = APThrottleMode.AUTO
-
-        # Add enroute flight plan
-        if not flight_plan == []:
-            self.flight_plan_name[index].extend(flight_plan)
-            if cruise_alt > -1:
-                self.flight_plan_target_alt[index].extend([cruise_alt for _ in flight_plan])
-            self.flight_plan_target_speed[index].extend([-1 for _ in flight_plan])
+            # TODO: Ignored alt restriction 2, alt restriction type, and speed restriction type
+            self._append_procedure(index, flight_plan_target_alt, flight_plan_target_speed, waypoint, alt_restriction, speed_restriction)
 
-            self.hv_next_wp[index] = True
-            self.lateral_mode[index] = APLateralMode.LNAV
-            self.auto_throttle_mode[index] = APThrottleMode.AUTO
+        # Add enroute flight plan. Without cruise altitude the waypoints have no altitude target (NaN)
+        self._append_procedure(index, flight_plan_target_alt, flight_plan_target_speed, flight_plan,
+                               [cruise_alt if cruise_alt > -1 else np.nan] * len(flight_plan), [-1] * len(flight_plan))
 
         # Add STAR to flight plan
         if not star == "":
-            waypoint, alt_restriction_type, alt_restriction, speed_resctriction_type, speed_restriction = Nav.get_procedure(arrival_airport, arrival_runway[2:], star)
-            if len(waypoint) > 0:
-                self.flight_plan_name[index].extend(waypoint)
-                self.flight_plan_target_alt[index].extend(alt_restriction)
-                self.flight_plan_target_speed[index].extend(speed_restriction)
-
-                self.hv_next_wp[index] = True
-                self.lateral_mode[index] = APLateralMode.LNAV
-                self.auto_throttle_mode[index] = APThrottleMode.AUTO
+            waypoint, alt_restriction_type, alt_restriction, speed_resctriction_type, speed_restriction = Nav.get_procedure(arrival_airport, arrival_runway_code, star)
+            self._append_procedure(index, flight_plan_target_alt, flight_plan_target_speed, waypoint, alt_restriction, speed_restriction)
 
         if not approach == "":
-            # Add Initial Approach to flight plan
-            waypoint, alt_restriction_type, alt_restriction, speed_resctriction_type, speed_restriction = Nav.get_procedure(arrival_airport, arrival_runway[2:], approach, appch="A", iaf=self.flight_plan_name[index][-1])
-            if len(waypoint) > 0:
-                # All waypoints are the same (can happen for IAPs where IAF is also a procedure turn)
-                if len(set(waypoint)) == 1:
-                    self.flight_plan_name[index].pop()
-                    self.flight_plan_target_alt[index].pop()
-                    self.flight_plan_target_speed[index].pop()
-                    # Add Initial Approach flight plan
-                    self.flight_plan_name[index].extend(waypoint[:1])
-                    self.flight_plan_target_alt[index].extend(alt_restriction[:1])
-                    self.flight_plan_target_speed[index].extend(speed_restriction[:1])
-                else:
-                    # Remove last element of flight plan which should be equal to iaf
-                    self.flight_plan_name[index].pop()
-                    self.flight_plan_target_alt[index].pop()
-                    self.flight_plan_target_speed[index].pop()
-                    # Add Initial Approach flight plan
-                    self.flight_plan_name[index].extend(waypoint)
-                    self.flight_plan_target_alt[index].extend(alt_restriction)
-                    self.flight_plan_target_speed[index].extend(speed_restriction)
-
-            # Add Final Approach to flight plan
-            waypoint, alt_restriction_type, alt_restriction, speed_resctriction_type, speed_restriction = Nav.get_procedure(arrival_airport, arrival_runway[2:], approach, appch=approach[0])
-            if len(waypoint) > 0:
-                # Remove last element of flight plan which should be equal to iaf
-                self.flight_plan_name[index].pop()
-                self.flight_plan_target_alt[index].pop()
-                self.flight_plan_target_speed[index].pop()
-                # Add Final Approach flight plan with missed approach removed)
-                # waypoint_idx = waypoint.index(' ')
-                # self.flight_plan_name[-1].extend(waypoint[:waypoint_idx])
-                # self.flight_plan_target_alt[-1].extend(alt_restriction_1[:waypoint_idx])
-                # self.flight_plan_target_speed[-1].extend(speed_restriction[:waypoint_idx])
-                self.flight_plan_name[index].extend(waypoint)
-                self.flight_plan_target_alt[index].extend(alt_restriction)
-                self.flight_plan_target_speed[index].extend(speed_restriction)
-                # TODO: For missed approach procedure [waypoint_idx+1:]
-
-                self.hv_next_wp[index] = True
-                self.lateral_mode[index] = APLateralMode.LNAV
-                self.auto_throttle_mode[index] = APThrottleMode.AUTO
+            # Add Initial Approach to flight plan, replacing the last waypoint which should be equal to iaf
+            waypoint, alt_restriction_type, alt_restriction, speed_resctriction_type, speed_restriction = Nav.get_procedure(arrival_airport, arrival_runway_code, approach, appch="A", iaf=flight_plan_name[-1])
+            # All waypoints are the same (can happen for IAPs where IAF is also a procedure turn)
+            if len(set(waypoint)) == 1:
+                waypoint, alt_restriction, speed_restriction = waypoint[:1], alt_restriction[:1], speed_restriction[:1]
+            self._append_procedure(index, flight_plan_target_alt, flight_plan_target_speed, waypoint, alt_restriction, speed_restriction,
+                                   replace_last=True, lnav=False)
+
+            # Add Final Approach to flight plan, replacing the last waypoint which should be equal to iaf
+            waypoint, alt_restriction_type, alt_restriction, speed_resctriction_type, speed_restriction = Nav.get_procedure(arrival_airport, arrival_runway_code, approach, appch=approach[0])
+            # TODO: For missed approach procedure
+            self._append_procedure(index, flight_plan_target_alt, flight_plan_target_speed, waypoint, alt_restriction, speed_restriction,
+                                   replace_last=True)
 
         # Get Lat Long of flight plan waypoints
-        for i, val in enumerate(self.flight_plan_name[index]):
-            if i == 0:
-                lat_tmp, long_tmp = Nav.get_wp_coord(val, self.lat[index], self.long[index])
-                self.flight_plan_lat[index].append(lat_tmp)
-                self.flight_plan_long[index].append(long_tmp)
-            else:
-                lat_tmp, long_tmp = Nav.get_wp_coord(val, self.flight_plan_lat[index][i - 1], self.flight_plan_long[index][i - 1])
-                self.flight_plan_lat[index].append(lat_tmp)
-                self.flight_plan_long[index].append(long_tmp)
+        flight_plan_lat, flight_plan_long = Nav.get_wp_coords(flight_plan_name, self.lat[index], self.long[index])
 
         # TODO: Add runway lat long alt
         if not arrival_runway == "":
-            lat_tmp, long_tmp, alt_tmp = Nav.get_runway_coord(arrival_airport, arrival_runway[2:])
-            if self.flight_plan_name[index][-1] == arrival_runway:
-                self.flight_plan_lat[index][-1] = lat_tmp
-                self.flight_plan_long[index][-1] = long_tmp
-                self.flight_plan_target_alt[index][-1] = alt_tmp
+            lat_tmp, long_tmp, alt_tmp = Nav.get_runway_coord(arrival_airport, arrival_runway_code)
+            if flight_plan_name[-1] == arrival_runway:
+                flight_plan_lat[-1] = lat_tmp
+                flight_plan_long[-1] = long_tmp
+                flight_plan_target_alt[-1] = alt_tmp
             else:
-                self.flight_plan_name[index].append(f'{arrival_airport}_{arrival_runway}')
-                self.flight_plan_lat[index].append(lat_tmp)
-                self.flight_plan_long[index].append(long_tmp)
-                self.flight_plan_target_alt[index].append(alt_tmp)
-                # self.flight_plan_target_speed[index].append(self.flight_plan_target_speed[index][-1])
-                self.flight_plan_target_speed[index].append(0)
+                flight_plan_name.append(sys.intern(f'{arrival_airport}_{arrival_runway}'))
+                flight_plan_lat.append(lat_tmp)
+                flight_plan_long.append(long_tmp)
+                flight_plan_target_alt.append(alt_tmp)
+                # flight_plan_target_speed.append(flight_plan_target_speed[-1])
+                flight_plan_target_speed.append(0)
 
                 # Add opposite direction runway for alignment
                 # TODO: this is a little hacky... maybe project a point out runway length?
@@ -323,34 +398,213 @@ class Autopilot:
                     opp_runway = opp_runway + 'C'
 
                 lat_tmp, long_tmp, alt_tmp = Nav.get_runway_coord(arrival_airport, opp_runway)
-                self.flight_plan_name[index].append(f'{arrival_airport}_{arrival_runway}_END')
-                self.flight_plan_lat[index].append(lat_tmp)
-                self.flight_plan_long[index].append(long_tmp)
-                self.flight_plan_target_alt[index].append(alt_tmp)
-                # self.flight_plan_target_speed[index].append(self.flight_plan_target_speed[index][-1])
-                self.flight_plan_target_speed[index].append(0)
-
-        # Populate alt and speed target from last waypoint
-        if len(self.flight_plan_target_alt[index]) > 1:
-            self.flight_plan_target_alt[index][-1] = 0.0
-            for i, val in reversed(list(enumerate(self.flight_plan_target_alt[index]))):
-                if val == -1:
-                    self.flight_plan_target_alt[index][i] = self.flight_plan_target_alt[index][i+1]
+                flight_plan_name.append(sys.intern(f'{arrival_airport}_{arrival_runway}_END'))
+                flight_plan_lat.append(lat_tmp)
+                flight_plan_long.append(long_tmp)
+                flight_plan_target_alt.append(alt_tmp)
+                # flight_plan_target_speed.append(flight_plan_target_speed[-1])
+                flight_plan_target_speed.append(0)
+
+        # Populate alt and speed target from last waypoint, skipping waypoints without altitude target
+        restricted = [i for i, val in enumerate(flight_plan_target_alt) if not np.isnan(val)]
+        if len(restricted) > 1:
+            flight_plan_target_alt[restricted[-1]] = 0.0
+            for i, below in zip(reversed(restricted[:-1]), reversed(restricted[1:])):
+                if flight_plan_target_alt[i] == -1:
+                    flight_plan_target_alt[i] = flight_plan_target_alt[below]
 
         # for i, val in reversed(list(enumerate(self.flight_plan_target_speed[n]))):
         #     if val == -1:
         #         self.flight_plan_target_speed[n][i] = self.flight_plan_target_speed[n][i+1]
 
         # Add departure airport
-        self.flight_plan_name[index].insert(0, f'{departure_airport} {departure_runway}')
-        self.flight_plan_lat[index].insert(0, lat_dep)
-        self.flight_plan_long[index].insert(0, long_dep)
-        self.flight_plan_target_alt[index].insert(0, alt_dep)
-        self.flight_plan_target_speed[index].insert(0, 0)
+        flight_plan_name.insert(0, sys.intern(f'{departure_airport} {departure_runway}'))
+        flight_plan_lat.insert(0, lat_dep)
+        flight_plan_long.insert(0, long_dep)
+        flight_plan_target_alt.insert(0, alt_dep)
+        flight_plan_target_speed.insert(0, 0)
+
+        self._set_waypoints(index, flight_plan_lat, flight_plan_long, flight_plan_target_alt, flight_plan_target_speed)
+        self._index_flight_plan_names(index)
+
+        logger.debug("Set flight plan final: %s", flight_plan_name)
+
+    def _append_procedure(self, index, flight_plan_target_alt, flight_plan_target_speed, waypoint, alt_restriction, speed_restriction, replace_last=False, lnav=True):
+        """
+        Append the waypoints of a procedure to the flight plan being built by set_flight_plan().
+
+        Parameters
+        ----------
+        index : int
+            Index of the aircraft
+        flight_plan_target_alt : float[]
+            Target altitude list being built [ft]
+        flight_plan_target_speed : float[]
+            Target speed list being built [cas/mach]
+        waypoint : string[]
+            Waypoint names
+        alt_restriction : float[]
+            Altitude restriction of each waypoint, -1 to use the next restriction below, NaN for no altitude target [ft]
+        speed_restriction : float[]
+            Speed restriction of each waypoint [cas/mach]
+        replace_last : bool, optional
+            Remove the last waypoint of the flight plan before appending, by default False
+        lnav : bool, optional
+            Engage LNAV and auto throttle, by default True
+        """
+        if len(waypoint) == 0:
+            return
+        flight_plan_name = self.flight_plan_name[index]
+        if replace_last:
+            flight_plan_name.pop()
+            flight_plan_target_alt.pop()
+            flight_plan_target_speed.pop()
+        flight_plan_name += _intern(waypoint)
+        flight_plan_target_alt += list(alt_restriction)
+        flight_plan_target_speed += list(speed_restriction)
+
+        if lnav:
+            self.hv_next_wp[index] = True
+            self.lateral_mode[index] = APLateralMode.LNAV
+            self.auto_throttle_mode[index] = APThrottleMode.AUTO
+
+    def _ensure_capacity(self, n):
+        """
+        Grow the state buffers so that they can hold n aircraft.
+
+        Parameters
+        ----------
+        n : int
+            Number of aircraft required
+        """
+        if n > self._capacity:
+            capacity = max(n, 2 * self._capacity)
+            for buffer in self._columns:
+                old = getattr(self, buffer)
+                new = np.empty((capacity,) + old.shape[1:], dtype=old.dtype)
+                new[:self._size] = old[:self._size]
+                setattr(self, buffer, new)
+            self._capacity = capacity
+
+    def _ensure_waypoint_capacity(self, n):
+        """
+        Widen the 2D flight plan arrays so that each row can hold n waypoints.
+
+        Parameters
+        ----------
+        n : int
+            Number of waypoints required
+        """
+        width = self.flight_plan_lat.shape[1]
+        if n > width:
+            pad = [(0, 0), (0, max(n, 2 * width) - width)]
+            for buffer in ('_flight_plan_lat_buf', '_flight_plan_long_buf', '_flight_plan_lat_rad_buf', '_flight_plan_target_alt_buf', '_flight_plan_target_speed_buf'):
+                setattr(self, buffer, np.pad(getattr(self, buffer), pad, constant_values=np.nan))
+
+    def _set_waypoints(self, index, lat, long, target_alt, target_speed):
+        """
+        Store the waypoints of a flight plan in the 2D flight plan arrays.
+
+        Parameters
+        ----------
+        index : int
+            Index of the aircraft
+        lat : float[]
+            Latitude of waypoints [deg]
+        long : float[]
+            Longitude of waypoints [deg]
+        target_alt : float[]
+            Target altitude at each waypoint [ft]
+        target_speed : float[]
+            Target speed at each waypoint [cas/mach]
+        """
+        n = len(lat)
+        self._ensure_waypoint_capacity(n)
+        for array, values in ((self.flight_plan_lat, lat), (self.flight_plan_long, long), (self.flight_plan_lat_rad, np.deg2rad(lat)),
+                              (self.flight_plan_target_alt, target_alt), (self.flight_plan_target_speed, target_speed)):
+            array[index] = np.nan
+            array[index, :n] = values
+        self.flight_plan_len[index] = n
+
+    def insert_waypoint(self, index, i, name, lat, long, target_alt, target_speed):
+        """
+        Insert a waypoint into the flight plan of an aircraft.
+
+        Parameters
+        ----------
+        index : int
+            Index of the aircraft
+        i : int
+            Position of the new waypoint in the flight plan
+        name : str
+            Name of the waypoint
+        lat : float
+            Latitude of the waypoint [deg]
+        long : float
+            Longitude of the waypoint [deg]
+        target_alt : float
+            Target altitude at the waypoint [ft]
+        target_speed : float
+            Target speed at the waypoint [cas/mach]
+        """
+        n = self.flight_plan_len[index]
+        self._ensure_waypoint_capacity(n + 1)
+        for array, value in ((self.flight_plan_lat, lat), (self.flight_plan_long, long), (self.flight_plan_lat_rad, np.deg2rad(lat)),
+                             (self.flight_plan_target_alt, target_alt), (self.flight_plan_target_speed, target_speed)):
+            array[index, i+1:n+1] = array[index, i:n]
+            array[index, i] = value
+        self.flight_plan_name[index].insert(i, name)
+        self.flight_plan_len[index] = n + 1
+        self._index_flight_plan_names(index)
+
+    def _index_flight_plan_names(self, index):
+        """
+        Rebuild the waypoint name lookup of a flight plan.
+
+        Parameters
+        ----------
+        index : int
+            Index of the aircraft
+        """
+        name_index = {}
+        for k, name in enumerate(self.flight_plan_name[index]):
+            name_index.setdefault(name, k)
+        self._flight_plan_name_index[index] = name_index
 
-        print("Set flight plan final:", self.flight_plan_name[index])
+    def set_holding(self, index, holding_time, holding_info):
+        """
+        Set the holding procedure of an aircraft.
 
+        Parameters
+        ----------
+        index : int
+            Index of the aircraft
+        holding_time : float
+            How long should the aircraft hold [second]
+        holding_info : list
+            Holding procedure from Nav.get_holding_procedure()
+        """
+        self.holding_round[index] = holding_time
+        self.holding_info[index] = holding_info
+        self.holding_course[index] = holding_info[4]
+        self.holding_leg[index] = holding_info[6] * 1852.0 / 1000.0
 
+    def set_target_alt(self, index, alt):
+        """
+        Set the target altitude of the current waypoint and the autopilot. Past the last waypoint only the autopilot
+        target is set.
+
+        Parameters
+        ----------
+        index : int
+            Index of the aircraft
+        alt : float
+            Target altitude [ft]
+        """
+        flight_plan_index = self.flight_plan_index[index]
+        if flight_plan_index < self.flight_plan_len[index]:
+            self.flight_plan_target_alt[index, flight_plan_index] = alt
+        self.alt[index] = alt
 
     def del_aircraft(self, index):
         """
@@ -361,39 +615,17 @@ class Autopilot:
         index : float
             The index of the aircraft to be deleted
         """
-        self.alt = np.delete(self.alt, index)
-        self.heading = np.delete(self.heading, index)
-        self.track_angle = np.delete(self.track_angle, index)
-        self.ap_rate_of_turn = np.delete(self.ap_rate_of_turn, index)
-        self.cas = np.delete(self.cas, index)
-        self.mach = np.delete(self.mach, index)
-        self.vs = np.delete(self.vs, index)
-        self.fpa = np.delete(self.fpa, index)
-        self.lat = np.delete(self.lat, index)
-        self.long = np.delete(self.long, index)
-        self.lat_next = np.delete(self.lat_next, index)
-        self.long_next = np.delete(self.long_next, index)
-        self.lat_prev = np.delete(self.lat_prev, index)
-        self.long_prev = np.delete(self.long_prev, index)
-        self.hv_next_wp = np.delete(self.hv_next_wp, index)
-        self.dist = np.delete(self.dist, index)
-        self.flight_plan_index = np.delete(self.flight_plan_index, index)
+        # Shift the rows after index up by one to keep the order of traffic array
+        for buffer in self._columns:
+            array = getattr(self, buffer)
+            array[index:self._size-1] = array[index+1:self._size]
+        self._size = self._size - 1
+        self._updated_rows = [row - (row > index) for row in self._updated_rows if row != index]
+
         del self.flight_plan_enroute[index]
         del self.flight_plan_name[index]
-        del self.flight_plan_lat[index]
-        del self.flight_plan_long[index]
-        del self.flight_plan_target_alt[index]
-        del self.flight_plan_target_speed[index]
-        self.procedure_speed = np.delete(self.procedure_speed, index)
-        self.speed_mode = np.delete(self.speed_mode, index)
-        self.auto_throttle_mode = np.delete(self.auto_throttle_mode, index)
-        self.vertical_mode = np.delete(self.vertical_mode, index)
-        self.lateral_mode = np.delete(self.lateral_mode, index)
-        self.expedite_descent =np.delete(self.expedite_descent, index)
-        self.holding = np.delete(self.holding, index)
-        self.holding_round = np.delete(self.holding_round, index)
+        del self._flight_plan_name_index[index]
         del self.holding_info[index]
-
         del self.departure_airport[index]
         del self.departure_runway[index]
         del self.sid[index]
@@ -401,7 +633,6 @@ class Autopilot:
         del self.arrival_runway[index]
         del self.star[index]
         del self.approach[index]
-        self.flight_plan_updated = np.delete(self.flight_plan_updated, index)
 
 
     def update(self, traffic: Traffic):
@@ -413,64 +644,77 @@ class Autopilot:
         traffic : Traffic
             Traffic class
         """
+        if self._size == 0:
+            return
+
+        perf = traffic.perf
+        weather = traffic.weather
+        p, rho, T = weather.p, weather.rho, weather.T
+
         # Update target based on flight plan
-        for i, val in enumerate(self.flight_plan_index):    #TODO: optimization
-            if val < len(self.flight_plan_name[i]):
-                # Target Flight Plan Lat/Long
-                # print(f"Target waypoint: {self.flight_plan_name[i][val]} @ {self.flight_plan_lat[i][val]}, {self.flight_plan_long[i][val]}")
-
-                self.lat_prev[i] = self.flight_plan_lat[i][val-1]
-                self.long_prev[i] = self.flight_plan_long[i][val-1]
-
-                self.lat[i] = self.flight_plan_lat[i][val]
-                self.long[i] = self.flight_plan_long[i][val]
-
-                # print('prev waypoint (we just passed):', self.flight_plan_name[i][val-1])
-                # print('curr waypoint (we are going to):', self.flight_plan_name[i][val])
-                # print('next waypoint (we will be going to):', self.flight_plan_name[i][val+1])
-
-                if val == len(self.flight_plan_name[i]) - 1:
-                    self.hv_next_wp[i] = False
-                else:
-                    # print(f"Next waypoint: {self.flight_plan_name[i][val+1]} @ {self.flight_plan_lat[i][val+1]}, {self.flight_plan_long[i][val+1]}")
-                    self.lat_next[i] = self.flight_plan_lat[i][val+1]
-                    self.long_next[i] = self.flight_plan_long[i][val+1]
-                    self.hv_next_wp[i] = True
-
-                # Target Flight Plan Altitude
-                if len(self.flight_plan_target_alt[i]) > 1:
-                    self.alt[i] = self.flight_plan_target_alt[i][val]
-                # Target Flight Plan Speed
-                # if len(self.flight_plan_target_speed[i]) > 1:
-                #     if (self.flight_plan_target_speed[i][val] < 1.0):
-                #         self.mach[i] = self.flight_plan_target_speed[i][val]
-                #     else:
-                #         self.cas[i] = self.flight_plan_target_speed[i][val]
-            else:
-                self.lateral_mode[i] = APLateralMode.HEADING
+        flight_plan_index = self.flight_plan_index
+        flight_plan_len = self.flight_plan_len
+        active = flight_plan_index < flight_plan_len
+        rows = np.flatnonzero(active)
+        val = flight_plan_index[rows]
+        n = flight_plan_len[rows]
+
+        # Target Flight Plan Lat/Long
+        prev = np.where(val == 0, n, val) - 1      # Index 0 wraps around to the last waypoint
+        self.lat_prev[rows] = self.flight_plan_lat[rows, prev]
+        self.long_prev[rows] = self.flight_plan_long[rows, prev]
+        self.lat[rows] = self.flight_plan_lat[rows, val]
+        self.long[rows] = self.flight_plan_long[rows, val]
+        self.lat_rad[rows] = self.flight_plan_lat_rad[rows, val]
+
+        has_next = val < n - 1
+        self.hv_next_wp[rows] = has_next
+        next_rows = rows[has_next]
+        next_val = val[has_next] + 1
+        self.lat_next[next_rows] = self.flight_plan_lat[next_rows, next_val]
+        self.long_next[next_rows] = self.flight_plan_long[next_rows, next_val]
+        self.lat_next_rad[next_rows] = self.flight_plan_lat_rad[next_rows, next_val]
+
+        # Target Flight Plan Altitude, kept when the waypoint has no altitude target
+        target_alt = self.flight_plan_target_alt[rows, val]
+        has_alt = (n > 1) & ~np.isnan(target_alt)
+        self.alt[rows[has_alt]] = target_alt[has_alt]
+        # Target Flight Plan Speed
+        # if len(self.flight_plan_target_speed[i]) > 1:
+        #     if (self.flight_plan_target_speed[i][val] < 1.0):
+        #         self.mach[i] = self.flight_plan_target_speed[i][val]
+        #     else:
+        #         self.cas[i] = self.flight_plan_target_speed[i][val]
+
+        self.lateral_mode[~active] = APLateralMode.HEADING
 
         # self.alt = np.minimum(self.alt, traffic.max_alt)   #Altitude
 
         # Procedural speed. Follow procedural speed by default.
         # After transitions altitude, constant mach
-        self.procedure_speed = traffic.perf.get_procedure_speed(traffic.alt, traffic.trans_alt, traffic.configuration)
+        self.procedure_speed = perf.get_procedure_speed(traffic.alt, traffic.trans_alt, traffic.configuration)
         # TODO: Check procedure speed with SID STAR limitation
 
-        self.cas = np.where((self.auto_throttle_mode == APThrottleMode.AUTO) & (self.procedure_speed >= 5.0), self.procedure_speed, self.cas)      #TODO: Add speed mode atc
-        self.cas = np.minimum(self.cas, traffic.max_cas)
-        self.mach = np.where((self.auto_throttle_mode == APThrottleMode.AUTO) & (self.procedure_speed < 5.0), self.procedure_speed, self.mach)      #TODO: Add speed mode atc
-        self.mach = np.minimum(self.mach, traffic.max_mach)
+        # Target speeds are updated in place in the state buffers
+        cas = self.cas
+        mach = self.mach
+        auto_throttle = self.auto_throttle_mode == APThrottleMode.AUTO
+        np.copyto(cas, self.procedure_speed, where=auto_throttle & (self.procedure_speed >= 5.0))      #TODO: Add speed mode atc
+        np.minimum(cas, traffic.max_cas, out=cas)
+        np.copyto(mach, self.procedure_speed, where=auto_throttle & (self.procedure_speed < 5.0))      #TODO: Add speed mode atc
+        np.minimum(mach, traffic.max_mach, out=mach)
 
         # Handle change in speed mode.
-        self.mach = np.where(traffic.speed_mode == SpeedMode.CAS, traffic.perf.tas_to_mach(traffic.perf.cas_to_tas(Unit.kts2mps(self.cas), traffic.weather.p, traffic.weather.rho), traffic.weather.T), self.mach)
-        self.cas = np.where(traffic.speed_mode == SpeedMode.MACH, Unit.mps2kts(traffic.perf.tas_to_cas(traffic.perf.mach_to_tas(self.mach, traffic.weather.T), traffic.weather.p, traffic.weather.rho)), self.cas)
+        cas_speed_mode = traffic.speed_mode == SpeedMode.CAS
+        np.copyto(mach, perf.tas_to_mach(perf.cas_to_tas(Unit.kts2mps(cas), p, rho), T), where=cas_speed_mode)
+        np.copyto(cas, Unit.mps2kts(perf.tas_to_cas(perf.mach_to_tas(mach, T), p, rho)), where=traffic.speed_mode == SpeedMode.MACH)
 
         # Speed mode
-        self.speed_mode = np.where(traffic.speed_mode == SpeedMode.CAS,
-                                   np.select([self.cas < traffic.cas, self.cas == traffic.cas, self.cas > traffic.cas],
-                                             [APSpeedMode.DECELERATE, APSpeedMode.CONSTANT_CAS, APSpeedMode.ACCELERATE]),
-                                   np.select([self.mach < traffic.mach, self.mach == traffic.mach, self.mach > traffic.mach],
+        np.copyto(self.speed_mode, np.select([mach < traffic.mach, mach == traffic.mach, mach > traffic.mach],
                                              [APSpeedMode.DECELERATE, APSpeedMode.CONSTANT_MACH, APSpeedMode.ACCELERATE]))
+        np.copyto(self.speed_mode, np.select([cas < traffic.cas, cas == traffic.cas, cas > traffic.cas],
+                                             [APSpeedMode.DECELERATE, APSpeedMode.CONSTANT_CAS, APSpeedMode.ACCELERATE]),
+                  where=cas_speed_mode)
 
         # Vertical mode
         traffic.vertical_mode = np.select(condlist=[
@@ -484,44 +728,62 @@ class Autopilot:
                                                 VerticalMode.DESCENT
                                             ])
 
-        # Waypoint, track angle, and heading
+        # Waypoint, track angle, and heading (angle differences are Cal.cal_angle_diff() written inline)
         # dist = np.where(self.lateral_mode == AP_lateral_mode.HEADING, 0.0, Calculation.cal_great_circle_distance(traffic.lat, traffic.long, self.lat, self.long))   #km
-        dist = Cal.cal_great_circle_dist(traffic.lat, traffic.long, self.lat, self.long)   #km
+        # Sine and cosine of latitudes shared by the distance and bearing calculations below
+        rad = np.deg2rad(traffic.lat)
+        sin_lat, cos_lat = np.sin(rad), np.cos(rad)
+        sin_lat_wp, cos_lat_wp = np.sin(self.lat_rad), np.cos(self.lat_rad)
+        sin_lat_next, cos_lat_next = np.sin(self.lat_next_rad), np.cos(self.lat_next_rad)
+
+        dist = Cal.cal_great_circle_dist_trig(traffic.lat, traffic.long, self.lat, self.long, cos_lat, cos_lat_wp)   #km
 
-        self.dist = np.where(self.flight_plan_updated, dist, self.dist)
-        self.flight_plan_updated = np.where(self.flight_plan_updated, False, self.flight_plan_updated)
+        if self._updated_rows:
+            self.dist[self._updated_rows] = dist[self._updated_rows]
+            self._updated_rows.clear()
 
         # cross_track = Cal.cal_cross_track_dist(self.lat_prev, self.long_prev, self.lat, self.long, traffic.lat, traffic.long)
         # cross_track2 = Cal.cal_dist_off_path(self.lat_prev, self.long_prev, self.lat, self.long, traffic.lat, traffic.long)
         # print(cross_track, cross_track2)
 
         # Fly by turn
-        turn_radius = traffic.perf.cal_turn_radius(traffic.perf.get_bank_angles(traffic.configuration), Unit.kts2mps(traffic.tas)) / 1000.0     #km
-        next_track_angle = np.where(self.hv_next_wp, Cal.cal_great_circle_bearing(self.lat, self.long, self.lat_next, self.long_next), self.track_angle)    # Next track angle to next next waypoint
-        curr_track_angle = Cal.cal_great_circle_bearing(traffic.lat, traffic.long, self.lat, self.long) # Current track angle to next waypoint #!TODO consider current heading
-        turn_dist = turn_radius * np.tan(np.deg2rad(np.abs(Cal.cal_angle_diff(next_track_angle, curr_track_angle)) / 2.0)) * 0.8    # Distance to turn
+        turn_radius = perf.get_turn_radius(traffic.configuration, Unit.kts2mps(traffic.tas)) / 1000.0     #km
+        next_track_angle = np.where(self.hv_next_wp, Cal.cal_great_circle_bearing_trig(self.long, self.long_next, sin_lat_wp, cos_lat_wp, sin_lat_next, cos_lat_next), self.track_angle)    # Next track angle to next next waypoint
+        curr_track_angle = Cal.cal_great_circle_bearing_trig(traffic.long, self.long, sin_lat, cos_lat, sin_lat_wp, cos_lat_wp) # Current track angle to next waypoint #!TODO consider current heading
+        turn_dist = turn_radius * np.tan(np.deg2rad(np.abs(np.mod(curr_track_angle - next_track_angle + 180.0, 360.0) - 180.0) / 2.0)) * 0.8    # Distance to turn
 
         # Adjust track angle for cross track
         cross_track = Cal.cal_dist_off_path(self.lat_prev, self.long_prev, self.lat, self.long, traffic.lat, traffic.long)
         # Apply 20 degree correction angle when cross track is greater than 200m, otherwise scale down to 0
-        correction = np.where(np.abs(cross_track) > 200, np.sign(cross_track) * 20, 20 * (1 - np.exp(-cross_track / 40)))
-        curr_track_angle = curr_track_angle + correction
+        # The intermediate arrays are reused in place instead of allocating one per np.where branch
+        correction = np.exp(-cross_track / 40)
+        np.subtract(1, correction, out=correction)
+        correction *= 20
+        large = np.abs(cross_track) > 200
+        correction[large] = np.sign(cross_track[large]) * 20
+        curr_track_angle += correction
 
         # print(cross_track, correction, curr_track_angle)
 
-        lnav_track_angle = np.where(
-            dist < turn_dist,
-            np.where(self.hv_next_wp, next_track_angle, self.track_angle),
-            np.where(dist < 1.0, self.track_angle, curr_track_angle)
-        )
-
-        self.track_angle =  np.where(self.lateral_mode == APLateralMode.HEADING, 0.0, lnav_track_angle)
-        self.heading = np.where(self.lateral_mode == APLateralMode.HEADING, self.heading, self.track_angle + np.arcsin(traffic.weather.wind_speed / traffic.tas * np.sin(self.track_angle - traffic.weather.wind_direction))) #https://www.omnicalculator.com/physics/wind-correction-angle
-
-        update_next_wp = (self.lateral_mode == APLateralMode.LNAV) & (dist > self.dist) & (np.abs(Cal.cal_angle_diff(traffic.heading, next_track_angle)) < 1.0)
+        # LNAV track angle, written over the previous track angle which is kept where the aircraft is close to the waypoint
+        heading_mode = self.lateral_mode == APLateralMode.HEADING
+        track_angle = self.track_angle
+        in_turn = dist < turn_dist
+        np.copyto(track_angle, next_track_angle, where=in_turn & self.hv_next_wp)
+        np.copyto(track_angle, curr_track_angle, where=~in_turn & ~(dist < 1.0))
+        track_angle[heading_mode] = 0.0
+        # Wind correction angle arcsin(x), with a Taylor series for the usual small x and arcsin only for the rest
+        x = weather.wind_speed / traffic.tas * np.sin(track_angle - weather.wind_direction)
+        wind_correction = x * (1.0 + x * x * (1.0 / 6.0 + x * x * (3.0 / 40.0)))
+        large = np.abs(x) > 0.1
+        wind_correction[large] = np.arcsin(x[large])
+        np.copyto(self.heading, track_angle + wind_correction, where=~heading_mode) #https://www.omnicalculator.com/physics/wind-correction-angle
+
+        update_next_wp = (self.lateral_mode == APLateralMode.LNAV) & (dist > self.dist) & (np.abs(np.mod(next_track_angle - traffic.heading + 180.0, 360.0) - 180.0) < 1.0)
         # print(f"Update next waypoint: {update_next_wp}")
-        self.flight_plan_index = np.where(update_next_wp, self.flight_plan_index+1, self.flight_plan_index)
-        self.dist = np.where(update_next_wp, Cal.cal_great_circle_dist(traffic.lat, traffic.long, self.lat_next, self.long_next), dist)
+        self.flight_plan_index[update_next_wp] += 1
+        np.copyto(self.dist, dist)
+        np.copyto(self.dist, Cal.cal_great_circle_dist_trig(traffic.lat, traffic.long, self.lat_next, self.long_next, cos_lat, cos_lat_next), where=update_next_wp)
 
         # Fly over turn
         # self.track_angle =  np.where(self.lateral_mode == AP_lateral_mode.HEADING, 0.0, np.where(dist<1.0, self.track_angle, Calculation.cal_great_circle_bearing(traffic.lat, traffic.long, self.lat, self.long)))
@@ -530,24 +792,31 @@ class Autopilot:
         # self.dist = dist
 
         # Holding
-        for i, val in enumerate(self.holding):
-            if self.holding[i] == False:
-                if self.holding_info[i] and np.abs(Cal.cal_angle_diff(self.heading[i], self.holding_info[i][4])) < 90.0 and self.flight_plan_index[i] > self.flight_plan_name[i].index(self.holding_info[i][0]):   # Turn outbound
-                    self.heading[i] = np.mod(self.holding_info[i][4] + 180, 360)
-                    self.holding_round[i] -= 1
-                    self.flight_plan_index[i] -= 1
-                    self.lateral_mode[i] = APLateralMode.HEADING
-                    self.holding[i] = True
-            else:
-                if np.abs(Cal.cal_angle_diff(self.heading[i], self.holding_info[i][4])) < 90.0 and dist[i] < 1:   # Turn outbound
-                    self.heading[i] = np.mod(self.holding_info[i][4] + 180, 360)
-                    self.holding_round[i] -= 1
-
-                if np.abs(Cal.cal_angle_diff(self.heading[i], self.holding_info[i][4] + 180.0)) < 90.0 and dist[i] > Unit.nm2m(self.holding_info[i][6])/1000.0: # Turn inbound
-                    self.heading[i] = self.holding_info[i][4]
-                    if self.holding_round[i] <= 0:
-                        self.lateral_mode[i] = APLateralMode.LNAV
-                        self.holding[i] = False
-                        self.holding_info[i] = []
-
-                    # update_next_wp[i] = False
+        heading = self.heading
+        holding = self.holding.copy()
+        course = self.holding_course
+        outbound = np.mod(course + 180.0, 360.0)
+        # Start holding when the holding fix is passed while flying the inbound course
+        start = ~holding & (np.abs(np.mod(course - heading + 180.0, 360.0) - 180.0) < 90.0)
+        rows = np.flatnonzero(start)
+        start[rows] = self.flight_plan_index[rows] > np.array([self._flight_plan_name_index[i][self.holding_info[i][0]] for i in rows], dtype=int)
+        heading[start] = outbound[start]
+        self.holding_round[start] -= 1
+        self.flight_plan_index[start] -= 1
+        self.lateral_mode[start] = APLateralMode.HEADING
+        self.holding[start] = True
+
+        # Turn outbound
+        turn = holding & (np.abs(np.mod(course - heading + 180.0, 360.0) - 180.0) < 90.0) & (dist < 1)
+        heading[turn] = outbound[turn]
+        self.holding_round[turn] -= 1
+
+        # Turn inbound, checked against the heading after the outbound turn
+        turn = holding & (np.abs(np.mod(course + 180.0 - heading + 180.0, 360.0) - 180.0) < 90.0) & (dist > self.holding_leg)
+        heading[turn] = course[turn]
+        done = turn & (self.holding_round <= 0)
+        self.lateral_mode[done] = APLateralMode.LNAV
+        self.holding[done] = False
+        for i in np.flatnonzero(done):
+            self.holding_info[i] = []
+        course[done] = np.nan
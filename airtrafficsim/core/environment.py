@@ -98,6 +98,9 @@ class Environment:
         #       "/", self.end_time, "finished at", time.time() - start_time)
 
         if socketio != None:
+            # Apply commands received while paused
+            self.traffic.flush_commands()
+
             # Save to buffer
             data = np.column_stack((self.traffic.index,
                                     self.traffic.call_sign,
@@ -116,7 +119,6 @@ class Environment:
             now = time.time()
             if ((now - self.last_sent_time) > 0.5) or (self.global_time == self.end_time):
                 self.send_to_client(socketio)
-                socketio.sleep(0)
                 self.last_sent_time = now
                 self.buffer_data = []
 
@@ -195,38 +197,43 @@ class Environment:
 
         # Additional aircraft telemetry
         # TODO: emit at a slower rate? probably not necessary for now
-        aircraft_data = [
-            {
-                'callsign': self.traffic.call_sign[i].item(),
-                'aircraftType': self.traffic.aircraft_type[i].item(),
-                'flightPhase': self.traffic.flight_phase[i].item(),
-                'configuration': self.traffic.configuration[i].item(),
-                'lateralMode': self.traffic.ap.lateral_mode[i].item(),
-                'verticalMode': self.traffic.vertical_mode[i].item(),
-                'position': [self.traffic.lat[i].item(), self.traffic.long[i].item()],
-                'altitude': self.traffic.alt[i].item(),
-                'altimeter': self.traffic.altimeter[i].item(),
-                'heading': self.traffic.heading[i].item(),
-                'track': self.traffic.track_angle[i].item(),
-                'tas': 0 if self.traffic.flight_phase[i].item() == FlightPhase.TAXI_ORIGIN or self.traffic.flight_phase[i].item() == FlightPhase.TAXI_DEST else self.traffic.tas[i].item(),
-                'vs': 0 if self.traffic.flight_phase[i].item() == FlightPhase.TAXI_ORIGIN or self.traffic.flight_phase[i].item() == FlightPhase.TAXI_DEST else self.traffic.vs[i].item(),
-                'flightPlan': self.traffic.ap.flight_plan_name[i],
-                'flightPlanEnroute': self.traffic.ap.flight_plan_enroute[i],
-                'flightPlanPos': list(zip(self.traffic.ap.flight_plan_lat[i], self.traffic.ap.flight_plan_long[i])),
-                'flightPlanTargetSpeed': self.traffic.ap.flight_plan_target_speed[i],
-                'flightPlanIndex': self.traffic.ap.flight_plan_index[i].item(),
-                'dist': self.traffic.ap.dist[i],
-                'departureAirport': self.traffic.ap.departure_airport[i],
-                'departureRunway': self.traffic.ap.departure_runway[i],
-                'sid': self.traffic.ap.sid[i],
-                'arrivalAirport': self.traffic.ap.arrival_airport[i],
-                'arrivalRunway': self.traffic.ap.arrival_runway[i],
-                'star': self.traffic.ap.star[i],
-                'approach': self.traffic.ap.approach[i],
+        state = {key: value.tolist() for key, value in self.traffic.snapshot().items()}
+        ap = self.traffic.ap
+        lateral_mode = ap.lateral_mode.tolist()
+        flight_plan_index = ap.flight_plan_index.tolist()
+        aircraft_data = []
+        for i in (range(len(self.traffic.index)) if self.traffic_order is None else self.traffic_order):
+            on_ground = state['flight_phase'][i] == FlightPhase.TAXI_ORIGIN or state['flight_phase'][i] == FlightPhase.TAXI_DEST
+            flight_plan_len = ap.flight_plan_len[i]
+            aircraft_data.append({
+                'callsign': state['call_sign'][i],
+                'aircraftType': state['aircraft_type'][i],
+                'flightPhase': state['flight_phase'][i],
+                'configuration': state['configuration'][i],
+                'lateralMode': lateral_mode[i],
+                'verticalMode': state['vertical_mode'][i],
+                'position': [state['lat'][i], state['long'][i]],
+                'altitude': state['alt'][i],
+                'altimeter': state['altimeter'][i],
+                'heading': state['heading'][i],
+                'track': state['track_angle'][i],
+                'tas': 0 if on_ground else state['tas'][i],
+                'vs': 0 if on_ground else state['vs'][i],
+                'flightPlan': ap.flight_plan_name[i],
+                'flightPlanEnroute': ap.flight_plan_enroute[i],
+                'flightPlanPos': list(zip(ap.flight_plan_lat[i][:flight_plan_len].tolist(), ap.flight_plan_long[i][:flight_plan_len].tolist())),
+                'flightPlanTargetSpeed': ap.flight_plan_target_speed[i][:flight_plan_len].tolist(),
+                'flightPlanIndex': flight_plan_index[i],
+                'dist': ap.dist[i],
+                'departureAirport': ap.departure_airport[i],
+                'departureRunway': ap.departure_runway[i],
+                'sid': ap.sid[i],
+                'arrivalAirport': ap.arrival_airport[i],
+                'arrivalRunway': ap.arrival_runway[i],
+                'star': ap.star[i],
+                'approach': ap.approach[i],
                 'frequency': self.traffic.frequency[i],
-            }
-            for i in (range(len(self.traffic.index)) if self.traffic_order is None else self.traffic_order)
-        ]
+            })
 
         socketio.emit('simulationData', {
             'packet_id': self.packet_id,
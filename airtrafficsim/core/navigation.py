@@ -128,6 +128,24 @@ class Nav:
         './data/navigation/xplane/airports.csv'), header=None)
     """Airports data (extracted to contain only runway coordinates) https://developer.x-plane.com/article/airport-data-apt-dat-file-format-specification/"""
 
+    wp_name = None
+    """Names of all waypoints (fixes followed by navaids), sorted for binary search. Built on first use by get_wp_coord()"""
+    wp_lat = None
+    """Latitude of waypoints in the order of wp_name"""
+    wp_long = None
+    """Longitude of waypoints in the order of wp_name"""
+
+    @staticmethod
+    def build_wp_index():
+        """
+        Sort the fix and navaid names once so that waypoints can be found by binary search instead of comparing every name.
+        """
+        name = np.append(Nav.fix[2].to_numpy(), Nav.nav[7].to_numpy()).astype(str)
+        order = np.argsort(name, kind='stable')     # Stable to keep fixes before navaids of the same name
+        Nav.wp_lat = np.append(Nav.fix[0].to_numpy(), Nav.nav[1].to_numpy())[order]
+        Nav.wp_long = np.append(Nav.fix[1].to_numpy(), Nav.nav[2].to_numpy())[order]
+        Nav.wp_name = name[order]
+
     @staticmethod
     def get_wp_coord(name, lat, long):
         """
@@ -149,17 +167,13 @@ class Nav:
         lat, Long: float, float
             Latitude and Longitude of the waypoint
         """
-        # Find lat and long of all fixes that match the name
-        mask = Nav.fix[2].to_numpy() == name
-        fix_lat = Nav.fix[0].to_numpy()[mask]
-        fix_long = Nav.fix[1].to_numpy()[mask]
-        # Find lat and long of all navaids that match the name
-        mask = Nav.nav[7].to_numpy() == name
-        nav_lat = Nav.nav[1].to_numpy()[mask]
-        nav_long = Nav.nav[2].to_numpy()[mask]
-        # Combine fix and nav
-        wp_lat = np.append(fix_lat, nav_lat)
-        wp_long = np.append(fix_long, nav_long)
+        if Nav.wp_name is None:
+            Nav.build_wp_index()
+        # Find lat and long of all fixes and navaids that match the name
+        start = np.searchsorted(Nav.wp_name, name, side='left')
+        end = np.searchsorted(Nav.wp_name, name, side='right')
+        wp_lat = Nav.wp_lat[start:end]
+        wp_long = Nav.wp_long[start:end]
         if len(wp_lat) == 0:
             print(f"WARNING: No waypoint found for {name}")
             return None, None
@@ -168,6 +182,35 @@ class Nav:
             lat, long, wp_lat, wp_long), axis=0)
         return wp_lat[index], wp_long[index]
 
+    @staticmethod
+    def get_wp_coords(names, lat, long):
+        """
+        Get the coordinates of a sequence of waypoints, each taking the nearest match to the previous waypoint.
+
+        Parameters
+        ----------
+        names : String[]
+            ICAO names of the waypoints
+
+        lat : float
+            Latitude of the position before the first waypoint
+
+        long : float
+            Longitude of the position before the first waypoint
+
+        Returns
+        -------
+        lat, Long: float[], float[]
+            Latitude and Longitude of the waypoints
+        """
+        wp_lat = []
+        wp_long = []
+        for name in names:
+            lat, long = Nav.get_wp_coord(name, lat, long)
+            wp_lat.append(lat)
+            wp_long.append(long)
+        return wp_lat, wp_long
+
     @staticmethod
     def get_wp_in_area(lat1, long1, lat2, long2):
         """
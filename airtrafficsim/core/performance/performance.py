@@ -71,6 +71,14 @@ class Performance:
         self.__H_P_TROP = 11000
         """Geopotential pressure altitude [m]"""
 
+        # Nominal bank angles only depend on the configuration, so their tangent is computed once
+        if (self.performance_mode == "BADA"):
+            bank_angles = np.array([self.perf_model._Bada__PHI_NORM_CIV_TOLD, self.perf_model._Bada__PHI_NORM_CIV_OTHERS], dtype=float)
+        else:
+            bank_angles = np.array([15.0, 30.0])
+        self.__TAN_BANK_TOLD, self.__TAN_BANK_OTHERS = np.tan(np.deg2rad(bank_angles))
+        """Tangent of the nominal bank angles for take off/landing and other configurations [dimensionless]"""
+
     def add_aircraft(self, icao, engine=None, mass_class=2):
         """
         Add an aircraft to traffic array.
@@ -818,6 +826,25 @@ class Performance:
         """
         return np.square(V_tas) / self.__G_0 / np.tan(np.deg2rad(bank_angle))
 
+    def get_turn_radius(self, configuration, V_tas):
+        """
+        Calculate turn radius with the standard nominal bank angles of each configuration (Equation 5.3-1, Session 5.3)
+
+        Parameters
+        ----------
+        configuration: float[]
+            configuration from Traffic class [configuration enum]
+
+        V_tas: float[]
+            True air speed [m/s]
+
+        Returns
+        -------
+        turn_radius: float[]
+            Turn radius [m]
+        """
+        return np.square(V_tas) / self.__G_0 / np.where((configuration == Config.TAKEOFF) | (configuration == Config.LANDING), self.__TAN_BANK_TOLD, self.__TAN_BANK_OTHERS)
+
     def get_bank_angles(self, configuration):
         """
         Get standard nominal bank angles (Session 5.3)
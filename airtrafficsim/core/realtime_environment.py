@@ -15,6 +15,9 @@ class RealTimeEnvironment(Environment):
 
         self.socketio = None
 
+        self._lock = threading.Lock()
+        """Serializes simulation steps with commands received on the Socket.IO handler threads"""
+
     def create_log_files(self, directory_name):
         super().create_log_files(directory_name)
 
@@ -41,11 +44,12 @@ class RealTimeEnvironment(Environment):
         while True:
             socketio.sleep(max(0, next_time - time.time()))
 
-            if self.should_end():
-                self.end_time = self.global_time
-                break
+            with self._lock:
+                if self.should_end():
+                    self.end_time = self.global_time
+                    break
 
-            self.step(socketio)
+                self.step(socketio)
             next_time += (time.time() - next_time) // delay * delay + delay
 
     def run(self, socketio=None):
@@ -72,10 +76,11 @@ class RealTimeEnvironment(Environment):
 
                 receive_time = datetime.now()
 
-                res = self.handle_command(command['aircraft'], command['command'], command['payload'] if 'payload' in command else None)
+                with self._lock:
+                    res = self.handle_command(command['aircraft'], command['command'], command['payload'] if 'payload' in command else None)
 
-                self.cmd_writer.writerow([receive_time.isoformat(), command['aircraft'], command['command'], command['payload'] if 'payload' in command else ''])
-                self.cmd_file.flush()
+                    self.cmd_writer.writerow([receive_time.isoformat(), command['aircraft'], command['command'], command['payload'] if 'payload' in command else ''])
+                    self.cmd_file.flush()
 
                 return res
 
@@ -1,3 +1,5 @@
+from collections import defaultdict
+
 import numpy as np
 
 from airtrafficsim.core.autopilot import Autopilot
@@ -24,6 +26,8 @@ class Traffic:
         # Memory and index control vairable:
         self.n = 0
         """Aircraft count"""
+        self._version = 0
+        """Version of the traffic array layout. Increased when rows are removed."""
         # self.N = N
         # """Maximum aircraft count"""
 
@@ -45,14 +49,16 @@ class Traffic:
         #     ('d_T', 'f8'), ('d_p', 'f8'), ('T', 'f8'), ('p', 'f8'), ('rho', 'f8')
         # ])
 
-        self.index = np.zeros([0])
-        """Index array to indicate whether there is an aircraft active in each index."""
+        self.index = np.zeros([0], dtype=np.int32)
+        """Index array to indicate whether there is an aircraft active in each index. Kept in ascending order (new aircraft are appended with an increasing index)."""
 
         # General information
         self.call_sign = np.empty([0], dtype='U10')
         """Callsign [string]"""
         self.aircraft_type = np.empty([0], dtype='U4')
         """Aircraft type in ICAO format [string]"""
+        self.wake_category = np.empty([0], dtype='U1')
+        """ICAO wake category, only available with BADA performance model [string]"""
         self.configuration = np.zeros([0])
         """Aircraft configuration [Configuration enum 1: Clean, 2: Take Off, 3: Approach, 4: Landing]"""
         self.flight_phase = np.zeros([0])
@@ -137,6 +143,108 @@ class Traffic:
         # Misc
         self.frequency = []
 
+        # Command queue
+        self._pending = defaultdict(dict)
+        """Queued aircraft commands {(attribute path): {row: value}} applied by flush_commands()"""
+
+    def queue_command(self, field, row, value):
+        """
+        Queue a value to be written to a traffic array when flush_commands() is called.
+
+        Parameters
+        ----------
+        field : (str, ...)
+            Attribute path of the array relative to Traffic, e.g. ('ap', 'heading')
+        row : int
+            Row of the aircraft in traffic array
+        value : float
+            Value to be written
+        """
+        self._pending[field][row] = value
+
+    def get_command(self, field, row):
+        """
+        Get the commanded value of a traffic array, including commands not yet applied by flush_commands().
+
+        Parameters
+        ----------
+        field : (str, ...)
+            Attribute path of the array relative to Traffic, e.g. ('ap', 'heading')
+        row : int
+            Row of the aircraft in traffic array
+
+        Returns
+        -------
+        value : float
+            Queued value if there is one, otherwise the current value in the array
+        """
+        commands = self._pending.get(field)
+        if commands is not None and row in commands:
+            return commands[row]
+        target = self
+        for name in field:
+            target = getattr(target, name)
+        return target[row]
+
+    def flush_commands(self):
+        """
+        Write all queued aircraft commands with one vectorized assignment per array.
+        """
+        for field, commands in self._pending.items():
+            target = self
+            for name in field[:-1]:
+                target = getattr(target, name)
+            array = getattr(target, field[-1])
+            array[np.fromiter(commands.keys(), dtype=int, count=len(commands))] = list(commands.values())
+        self._pending.clear()
+
+    def find_row(self, index):
+        """
+        Find the row of an aircraft in traffic array.
+
+        Parameters
+        ----------
+        index : int
+            Index of an aircraft
+
+        Returns
+        -------
+        row : int
+            Row of the aircraft in traffic array. -1 if the aircraft does not exist.
+        """
+        row = int(np.searchsorted(self.index, index))
+        if row < len(self.index) and self.index[row] == index:
+            return row
+        return -1
+
+    def snapshot(self):
+        """
+        Get the current state of all aircraft at once.
+
+        Returns
+        -------
+        state : {str: np.ndarray}
+            Views of the traffic state arrays, indexed by row in traffic array
+        """
+        return {
+            'call_sign': self.call_sign,
+            'aircraft_type': self.aircraft_type,
+            'flight_phase': self.flight_phase,
+            'configuration': self.configuration,
+            'lat': self.lat,
+            'long': self.long,
+            'alt': self.alt,
+            'altimeter': self.altimeter,
+            'heading': self.heading,
+            'track_angle': self.track_angle,
+            'cas': self.cas,
+            'tas': self.tas,
+            'mach': self.mach,
+            'vs': self.vs,
+            'vertical_mode': self.vertical_mode,
+            'fuel_consumed': self.fuel_consumed,
+        }
+
     def add_aircraft(self, call_sign, aircraft_type, flight_phase, configuration, lat, long, alt, heading, cas, fuel_weight, payload_weight, departure_airport, departure_runway, sid, arrival_airport, arrival_runway, star, approach, flight_plan, flight_plan_index, cruise_alt, initial_frequency):
         """
         Add an aircraft to traffic array.
@@ -156,9 +264,11 @@ class Traffic:
         self.ap.add_aircraft(lat, long, alt, heading, cas, departure_airport, departure_runway,
                              sid, arrival_airport, arrival_runway, star, approach, flight_plan, flight_plan_index, cruise_alt)
 
-        self.index = np.append(self.index, self.n)
+        self.index = np.append(self.index, np.int32(self.n))
         self.call_sign = np.append(self.call_sign, call_sign)
         self.aircraft_type = np.append(self.aircraft_type, aircraft_type)
+        self.wake_category = np.append(self.wake_category, self.perf.perf_model._Bada__wake_category[-1]
+                                       if self.perf.performance_mode == "BADA" else "")
         self.configuration = np.append(self.configuration, configuration)
         self.flight_phase = np.append(self.flight_phase, flight_phase)
         self.lat = np.append(self.lat, lat)
@@ -219,10 +329,16 @@ class Traffic:
         """
         print("Traffic.py - del_aircraft()", index)
         print(self.index)
-        i = np.where(self.index == index)[0][0]
+        # Apply queued commands before rows are shifted
+        self.flush_commands()
+        i = self.find_row(index)
+        if i == -1:
+            print("Traffic.py - del_aircraft() aircraft not found", index)
+            return
         self.index = np.delete(self.index, i)
         self.call_sign = np.delete(self.call_sign, i)
         self.aircraft_type = np.delete(self.aircraft_type, i)
+        self.wake_category = np.delete(self.wake_category, i)
         self.configuration = np.delete(self.configuration, i)
         self.flight_phase = np.delete(self.flight_phase, i)
         self.lat = np.delete(self.lat, i)
@@ -260,6 +376,9 @@ class Traffic:
 
         del self.frequency[i]
 
+        # Rows after i have shifted
+        self._version = self._version + 1
+
     def update(self, global_time, d_t=1):
         """
         Update aircraft state for each timestep given ATC/autopilot command.
@@ -270,6 +389,9 @@ class Traffic:
             delta time per timestep [s] TODO: need?
         """
 
+        # Apply ATC commands
+        self.flush_commands()
+
         # Update atmosphere
         self.weather.update(self.lat, self.long, self.alt,
                             self.perf, global_time)
@@ -31,7 +31,7 @@ class FullFlightDemo(Environment):
                                       cruise_alt=37000)
 
     def should_end(self):
-        # if (self.global_time > 60 and  np.all((self.traffic.alt == 0))):
+        # if self.global_time > 60 and not self.traffic.alt.any():
         #     return True
         # else:
         return False
@@ -1,5 +1,6 @@
 from pathlib import Path
 from datetime import datetime
+from functools import lru_cache, wraps
 from matplotlib.figure import Figure
 from matplotlib import colors
 import numpy as np
@@ -11,6 +12,82 @@ import base64
 from airtrafficsim.core.navigation import Nav
 
 
+def _cache_by_data_dir(data_path):
+    """
+    Cache the images of a weather data handler, keyed by the handler arguments and the modification time of the data
+    directory of the file. Adding or replacing data files invalidates the cached images, and nothing is cached while
+    the directory does not exist.
+
+    Parameters
+    ----------
+    data_path : string
+        Path of the weather data relative to airtrafficsim/data/
+    """
+    def decorator(func):
+        cached = lru_cache(maxsize=64)(lambda mtime_ns, *args: func(*args))
+
+        @wraps(func)
+        def wrapper(file, *args):
+            path = Path(__file__).parent.parent.joinpath('data', data_path, file.split('-', 1)[0])
+            if not path.is_dir():
+                return func(file, *args)
+            return cached(path.stat().st_mtime_ns, file, *args)
+        return wrapper
+    return decorator
+
+
+def _sel_area(data, lat1, long1, lat2, long2):
+    """
+    Select the grid points of an ERA5 dataset within an area by coordinate slices.
+
+    Parameters
+    ----------
+    data : xarray.Dataset
+        ERA5 dataset with latitude and longitude [0, 360) coordinates
+    lat1 : float
+        Latitude (South)
+    long1 : float
+        Longitude (West)
+    lat2 : float
+        Latitude (North)
+    long2 : float
+        Longitude (East)
+
+    Returns
+    -------
+    xarray.Dataset
+        Dataset within the area
+    """
+    # ERA5 latitude is usually stored from north to south
+    latitude = slice(lat2, lat1) if data.latitude.values[0] > data.latitude.values[-1] else slice(lat1, lat2)
+    return data.sel(latitude=latitude, longitude=slice((long1+360.0) % 360.0, (long2+360.0) % 360.0))
+
+
+@lru_cache(maxsize=64)
+def _wp_in_area(lat1, long1, lat2, long2):
+    """
+    Get the navigation waypoints within an area, cached by area. Returned as tuples so that the cached value cannot be
+    modified by callers.
+
+    Parameters
+    ----------
+    lat1 : float
+        Latitude (South)
+    long1 : float
+        Longitude (West)
+    lat2 : float
+        Latitude (North)
+    long2 : float
+        Longitude (East)
+
+    Returns
+    -------
+    ((float, float, string))
+        Latitude, longitude and name of each waypoint
+    """
+    return tuple((float(fix[0]), float(fix[1]), str(fix[2])) for fix in Nav.get_wp_in_area(lat1, long1, lat2, long2))
+
+
 class Data:
     @staticmethod
     def get_nav(lat1, long1, lat2, long2):
@@ -40,7 +117,8 @@ class Data:
             "version": "1.0",
         }]
 
-        fixes = Nav.get_wp_in_area(lat1, long1, lat2, long2)
+        # The document is built for each call so that callers can modify it
+        fixes = _wp_in_area(lat1, long1, lat2, long2)
 
         for fix in fixes:
             document.append({
@@ -74,6 +152,7 @@ class Data:
         return document
 
     @staticmethod
+    @_cache_by_data_dir('weather/era5/')
     def get_era5_wind(file, lat1, long1, lat2, long2, time):
         """
         Get the ERA5 wind data image to client
@@ -97,7 +176,7 @@ class Data:
         # TODO: Improve data loading to avoid repetitive loading
         if Path(__file__).parent.parent.joinpath('data/weather/era5/',file.split('-', 1)[0]).is_dir():
             data = xr.open_dataset(Path(__file__).parent.parent.joinpath('data/weather/era5/',file.split('-', 1)[0]+'/multilevel.nc')).sel(level=900, time=datetime.fromisoformat(time), method="pad")
-            data = data.where((((data.latitude >= lat1) & (data.latitude <= lat2)) & ((data.longitude >= (long1+360.0) % 360.0) & (data.longitude <= (long2+360.0) % 360.0))), drop=True)
+            data = _sel_area(data, lat1, long1, lat2, long2)
             fig = Figure(figsize=(long2-long1, lat2-lat1), facecolor='none', dpi=500)
             ax = fig.add_axes([0, 0, 1, 1], projection=ccrs.PlateCarree(), frameon=False)
             ax.set_extent([long1, long2, lat1, lat2], crs=ccrs.PlateCarree())
@@ -138,6 +217,7 @@ class Data:
             ]
 
     @staticmethod
+    @_cache_by_data_dir('weather/era5/')
     def get_era5_rain(file, lat1, long1, lat2, long2, time):
         """
         Get the ERA5 rain data image to client
@@ -161,7 +241,7 @@ class Data:
         # TODO: Improve data loading to avoid repetitive loading
         if Path(__file__).parent.parent.joinpath('data/weather/era5/',file.split('-', 1)[0]).is_dir():
             data = xr.open_dataset(Path(__file__).parent.parent.joinpath('data/weather/era5/',file.split('-', 1)[0]+'/surface.nc')).sel(time=datetime.fromisoformat(time), method="pad")
-            data = data.where((((data.latitude >= lat1) & (data.latitude <= lat2)) & ((data.longitude >= (long1+360.0) % 360.0) & (data.longitude <= (long2+360.0) % 360.0))), drop=True)
+            data = _sel_area(data, lat1, long1, lat2, long2)
             fig = Figure(figsize=(long2-long1, lat2-lat1), facecolor='none', dpi=500)
             # fig = Figure(figsize=(360, 180), facecolor='none', dpi=100)
             ax = fig.add_axes([0, 0, 1, 1], projection=ccrs.PlateCarree(), frameon=False)
@@ -208,6 +288,7 @@ class Data:
             ]
 
     @staticmethod
+    @_cache_by_data_dir('weather/radar/')
     def get_radar_img(file, lat1, long1, lat2, long2, time):
         """
         Get the radar data image to client
@@ -160,8 +160,10 @@ class Replay:
             return trajectories
 
         elif replayCategory == 'simulation':
+            # Only the columns used by the CZML are parsed
             df = pd.read_csv(
-                Path(__file__).parent.parent.joinpath('data/result', replayFile))
+                Path(__file__).parent.parent.joinpath('data/result', replayFile),
+                usecols=['timestamp', 'id', 'callsign', 'lat', 'long', 'alt', 'cas'])
             document = [{
                 "id": "document",
                 "name": "simulation",
@@ -172,8 +174,7 @@ class Replay:
                 }
             }]
 
-            for id in df['id'].unique():
-                content = df[df['id'] == id]
+            for _, content in df.groupby('id', sort=False):
                 id = content.iloc[0]['callsign']
                 positions = np.column_stack(
                     (content['timestamp'], content['long'].values, content['lat'].values, content['alt'].values/3.2808)).flatten().tolist()
@@ -287,9 +288,9 @@ class Replay:
         data = []
         if mode == 'replay' and replayCategory == 'simulation' and graph != 'None':
             df = pd.read_csv(
-                Path(__file__).parent.parent.joinpath('data/result/', replayFile))
-            for id in df['id'].unique():
-                content = df[df['id'] == id]
+                Path(__file__).parent.parent.joinpath('data/result/', replayFile),
+                usecols=['timestep', 'id', 'callsign', graph])
+            for _, content in df.groupby('id', sort=False):
                 data.append({
                     "x": content['timestep'].to_list(),
                     "y": content[graph].to_list(),
@@ -300,9 +301,9 @@ class Replay:
 
         elif mode == 'simulation' and graph != 'None':
             df = pd.read_csv(Path(__file__).parent.parent.joinpath(
-                'data/result/', simulationFile, simulationFile+'.csv'))
-            for id in df['id'].unique():
-                content = df[df['id'] == id]
+                'data/result/', simulationFile, simulationFile+'.csv'),
+                usecols=['timestep', 'id', 'callsign', graph])
+            for _, content in df.groupby('id', sort=False):
                 data.append({
                     "x": content['timestep'].to_list(),
                     "y": content[graph].to_list(),
@@ -10,25 +10,60 @@ socketio : SocketIO()
 
 """
 
+import os
+import ssl
+from functools import lru_cache
 from pathlib import Path
-from importlib import import_module
+from importlib import import_module, reload
 from flask import Flask, render_template
 from flask_socketio import SocketIO, emit
-# import eventlet
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from airtrafficsim.server.replay import Replay
 from airtrafficsim.server.data import Data
+from airtrafficsim.server.socket_manager import QueuedEmitter
 
-# eventlet.monkey_patch()
+_BASE_PATH = Path(__file__).resolve().parents[3]
+frontend_path = _BASE_PATH.joinpath('out')
+_CERTFILE = _BASE_PATH.joinpath('certificates/localhost.pem')
+_KEYFILE = _BASE_PATH.joinpath('certificates/localhost-key.pem')
+
+class _OrjsonEncoder:
+    """JSON module interface for Socket.IO packets backed by orjson, which also serializes NumPy values."""
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return orjson.loads(s)
 
-frontend_path = Path(__file__).parent.parent.parent.parent.joinpath('out')
 
 app = Flask(__name__, static_url_path='', static_folder=frontend_path, template_folder=frontend_path)
-socketio = SocketIO(app, cors_allowed_origins='*', max_http_buffer_size=1e8,
-                    ping_timeout=60, async_mode='eventlet')  # engineio_logger=True
+# Only compress payloads above 4 KiB (CZML replays, weather images), small handler responses are sent as is
+# Each event is handled in its own thread, so slow raster handlers (ERA5, radar) do not block other events
+# The buffer size only limits messages received from the client, which are small commands and requests
+socketio = SocketIO(app, cors_allowed_origins='*', max_http_buffer_size=16*1024*1024,
+                    ping_interval=25, ping_timeout=60, async_mode='threading', async_handlers=True,
+                    compression_threshold=4096, json=_OrjsonEncoder if orjson is not None else None)  # engineio_logger=True
+emitter = QueuedEmitter(socketio)
 
 running_environment = None
 
+_LOADING_MSGS = {
+    'ConvertHistoricDemo': 'Converting historic data to simulation data... <br> Please check the terminal for progress.',
+    'WeatherDemo': 'Downloading weather data... <br> Please check the terminal for progress.',
+    '_default': 'Running simulation... <br> Please check the terminal for progress.',
+}
+"""Loading message shown by the client when a simulation file starts {string: string}"""
+
+_ENV_REGISTRY = {}
+"""Environment classes by file name, with the modification time of the file they were loaded from {string: (int, class)}"""
+
 @socketio.on('connect')
 def test_connect():
     """
@@ -125,11 +160,31 @@ def get_simulation_file():
     string[]
         List of simulation environment file names
     """
-    simulation_list = []
-    for file in sorted(Path(__file__).parent.parent.joinpath('data/environment/').glob('*.py')):
-        if file.name != '__init__.py':
-            simulation_list.append(file.name.removesuffix('.py'))
-    return simulation_list
+    environment_path = Path(__file__).parent.parent.joinpath('data/environment/')
+    return list(_list_simulation_files(environment_path, environment_path.stat().st_mtime_ns))
+
+
+@lru_cache(maxsize=4)
+def _list_simulation_files(environment_path, mtime_ns):
+    """
+    List the simulation environment files. Cached by the modification time of the directory, which changes when a file
+    is added, removed, or renamed.
+
+    Parameters
+    ----------
+    environment_path : Path
+        Path of the environment directory
+    mtime_ns : int
+        Modification time of the directory [ns]
+
+    Returns
+    -------
+    (string)
+        Simulation environment file names
+    """
+    with os.scandir(environment_path) as entries:
+        names = sorted(entry.name for entry in entries if entry.name.endswith('.py') and entry.name != '__init__.py')
+    return tuple(name.removesuffix('.py') for name in names)
 
 
 @socketio.on('runSimulation')
@@ -144,21 +199,41 @@ def run_simulation(file):
     """
     global running_environment
     print(file)
-    if file == "ConvertHistoricDemo":
-        socketio.emit('loadingMsg', 'Converting historic data to simulation data... <br> Please check the terminal for progress.')
-    elif file == "WeatherDemo":
-        socketio.emit('loadingMsg', 'Downloading weather data... <br> Please check the terminal for progress.')
-    else:
-        socketio.emit('loadingMsg', 'Running simulation... <br> Please check the terminal for progress.')
-    socketio.sleep(0)
-    Env = getattr(import_module('airtrafficsim.data.environment.' + file, '...'), file)
-    env = Env()
+    emitter.emit('loadingMsg', _LOADING_MSGS.get(file, _LOADING_MSGS['_default']))
+    env = _get_environment_class(file)()
 
     if running_environment is not None:
         running_environment.stop()
     running_environment = env
 
-    env.run(socketio)
+    env.run(emitter)
+    emitter.flush()
+
+
+def _get_environment_class(file):
+    """
+    Get the environment class of a simulation file from the registry. The module is imported on first use and reloaded
+    when the file has been modified since.
+
+    Parameters
+    ----------
+    file : string
+        Environment file name
+
+    Returns
+    -------
+    class
+        Environment class
+    """
+    mtime_ns = Path(__file__).parent.parent.joinpath('data/environment/', file + '.py').stat().st_mtime_ns
+    entry = _ENV_REGISTRY.get(file)
+    if entry is None or entry[0] != mtime_ns:
+        module = import_module('airtrafficsim.data.environment.' + file, '...')
+        if entry is not None:
+            module = reload(module)
+        entry = (mtime_ns, getattr(module, file))
+        _ENV_REGISTRY[file] = entry
+    return entry[1]
 
 
 @socketio.on('getNav')
@@ -277,4 +352,21 @@ def run_server(port=6111, host="0.0.0.0"):
     # Change host to 0.0.0.0 during deployment
     """Start the backend server."""
     print("Running server at http://localhost:"+str(port))
-    socketio.run(app, port=port, host=host, certfile=Path(__file__).parent.parent.parent.parent.resolve().joinpath('certificates/localhost.pem'), keyfile=Path(__file__).parent.parent.parent.parent.resolve().joinpath('certificates/localhost-key.pem'))
+    socketio.run(app, port=port, host=host, ssl_context=_create_ssl_context(), allow_unsafe_werkzeug=True)
+
+
+def _create_ssl_context():
+    """
+    Create the TLS context of the server from the localhost certificate, preferring ECDHE key exchange with AES-GCM and
+    without TLS compression.
+
+    Returns
+    -------
+    ssl.SSLContext
+        TLS context for the server
+    """
+    context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    context.load_cert_chain(_CERTFILE, _KEYFILE)
+    context.set_ciphers('ECDHE+AESGCM')
+    context.options |= ssl.OP_NO_COMPRESSION
+    return context
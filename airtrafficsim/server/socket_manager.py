@@ -0,0 +1,129 @@
+"""
+Queue of Socket.IO events sent to the client by a background worker.
+
+The server wraps its SocketIO object in a QueuedEmitter and passes it to the simulation in place of the SocketIO object.
+emit() enqueues the event and returns immediately, so the simulation never waits for the network. A single worker drains
+the queue and sends the queued events in batches, sleeping between batches. Sending is therefore throttled to one batch
+every _BATCH_INTERVAL, which adds up to _BATCH_INTERVAL of latency to each event.
+
+Events in _LATEST_ONLY carry the full simulation state, so only the most recent one is worth sending. A new one replaces
+the payload of the one still waiting in the queue instead of being queued behind it.
+
+Attributes:
+
+_BATCH_INTERVAL : float
+    Time between two batches [s]
+_BATCH_MAX : int
+    Maximum number of events sent in one batch
+_LATEST_ONLY : frozenset
+    Events of which only the most recent unsent payload is sent
+
+"""
+
+import logging
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+_BATCH_INTERVAL = 0.1
+_BATCH_MAX = 32
+_LATEST_ONLY = frozenset({'simulationData'})
+
+_LATEST = object()
+"""Queue placeholder for the payload of a _LATEST_ONLY event stored in QueuedEmitter._latest"""
+
+
+class QueuedEmitter:
+    """
+    SocketIO wrapper that sends emitted events from a background worker.
+
+    Every other attribute (on, sleep, start_background_task, ...) is delegated to the wrapped SocketIO object.
+    """
+
+    def __init__(self, socketio, maxsize=2000):
+        """
+        Initialize the emitter. The worker is started on the first emit().
+
+        Parameters
+        ----------
+        socketio : SocketIO()
+            A SocketIO object for communication
+        maxsize : int, optional
+            Maximum number of queued events, by default 2000
+        """
+        self.socketio = socketio
+        """Wrapped SocketIO object"""
+        self._queue = queue.Queue(maxsize)
+        """Queued (event, data) pairs, data is _LATEST for _LATEST_ONLY events"""
+        self._latest = {}
+        """Payload of the queued _LATEST_ONLY events {event: data}"""
+        self._lock = threading.Lock()
+        self._worker = None
+
+    def __getattr__(self, name):
+        return getattr(self.socketio, name)
+
+    def emit(self, event, data):
+        """
+        Queue an event to be sent to the client. The event is dropped with a warning when the queue is full.
+
+        Parameters
+        ----------
+        event : string
+            Name of the event
+        data : any
+            Payload of the event
+        """
+        with self._lock:
+            if self._worker is None:
+                self._worker = self.socketio.start_background_task(self._emit_worker)
+            if event in _LATEST_ONLY:
+                queued = event in self._latest
+                self._latest[event] = data
+                if queued:
+                    return
+                data = _LATEST
+            try:
+                self._queue.put_nowait((event, data))
+            except queue.Full:
+                self._latest.pop(event, None)
+                logger.warning("Socket.IO event queue is full, dropping %s event", event)
+
+    def flush(self, timeout=10.0):
+        """
+        Wait until all queued events have been sent.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum time to wait [s], by default 10.0
+
+        Returns
+        -------
+        bool
+            False if events were still queued after timeout
+        """
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(lambda: not self._queue.unfinished_tasks, timeout)
+
+    def _emit_worker(self):
+        """Send the queued events in batches of at most _BATCH_MAX events every _BATCH_INTERVAL seconds."""
+        while True:
+            events = [self._queue.get()]
+            while len(events) < _BATCH_MAX:
+                try:
+                    events.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            for event, data in events:
+                try:
+                    if data is _LATEST:
+                        with self._lock:
+                            data = self._latest.pop(event)
+                    self.socketio.emit(event, data)
+                except Exception:
+                    logger.exception("Failed to send %s event", event)
+                finally:
+                    self._queue.task_done()
+            self.socketio.sleep(_BATCH_INTERVAL)
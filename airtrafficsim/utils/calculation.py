@@ -68,6 +68,74 @@ class Cal:
             np.cos(np.deg2rad(lat1))*np.sin(np.deg2rad(lat2)) - np.sin(np.deg2rad(lat1))*np.cos(np.deg2rad(lat2))*np.cos(np.deg2rad(long2-long1)))
         ) + 360.0), 360.0)
 
+    @staticmethod
+    def cal_great_circle_dist_trig(lat1, long1, lat2, long2, cos_lat1, cos_lat2):
+        """
+        Calculate great circle distance in km between two point with precomputed cosine of latitudes.
+
+        Parameters
+        ----------
+        lat1 : float[]
+            Latitude of first point(s) [deg]
+        long1 : float[]
+            Longitude of first point(s) [deg]
+        lat2 : float[]
+            Latitude of second point(s) [deg]
+        long2 : float[]
+            Longitude of second point(s) [deg]
+        cos_lat1 : float[]
+            Cosine of latitude of first point(s)
+        cos_lat2 : float[]
+            Cosine of latitude of second point(s)
+
+        Returns
+        -------
+        float[]
+            Great circle distance [km]
+
+        Notes
+        -----
+        Same as cal_great_circle_dist(), for callers that reuse the trigonometric terms of a point in several calls.
+        """
+        a = np.square(np.sin((np.deg2rad(lat2-lat1))/2.0)) + \
+            cos_lat1 * cos_lat2 * \
+            np.square(np.sin((np.deg2rad(long2-long1))/2.0))
+        return 2.0 * 6371.009 * np.arctan2(np.sqrt(a), np.sqrt(1.0-a))
+
+    @staticmethod
+    def cal_great_circle_bearing_trig(long1, long2, sin_lat1, cos_lat1, sin_lat2, cos_lat2):
+        """
+        Calculate the great circle bearing of two points with precomputed sine and cosine of latitudes.
+
+        Parameters
+        ----------
+        long1 : float[]
+            Longitude of first point(s) [deg]
+        long2 : float[]
+            Longitude of second point(s) [deg]
+        sin_lat1 : float[]
+            Sine of latitude of first point(s)
+        cos_lat1 : float[]
+            Cosine of latitude of first point(s)
+        sin_lat2 : float[]
+            Sine of latitude of second point(s)
+        cos_lat2 : float[]
+            Cosine of latitude of second point(s)
+
+        Returns
+        -------
+        float[]
+            Bearing [deg 0-360]
+
+        Notes
+        -----
+        Same as cal_great_circle_bearing(), for callers that reuse the trigonometric terms of a point in several calls.
+        """
+        return np.mod((np.rad2deg(np.arctan2(
+            np.sin(np.deg2rad(long2-long1)) * cos_lat2,
+            cos_lat1*sin_lat2 - sin_lat1*cos_lat2*np.cos(np.deg2rad(long2-long1)))
+        ) + 360.0), 360.0)
+
     @staticmethod
     def cal_dest_given_dist_bearing(lat, long, bearing, dist):
         """
@@ -0,0 +1,170 @@
+import numpy as np
+import pytest
+from datetime import datetime
+
+from airtrafficsim.core.environment import Environment
+from airtrafficsim.core.aircraft import Aircraft
+from airtrafficsim.utils.enums import APLateralMode, Config, FlightPhase
+
+
+class TrafficEnv(Environment):
+    def __init__(self):
+        super().__init__(file_name="TrafficTest", start_time=datetime.fromisoformat('2022-03-22T00:00:00+00:00'),
+                         end_time=100, weather_mode="", performance_mode="OpenAP", create_log_file=False)
+
+    def should_end(self):
+        return False
+
+    def atc_command(self):
+        pass
+
+
+def add_aircraft(env, call_sign, lat=22.0, long=114.0, alt=20000.0, heading=175.0, cas=250.0, cruise_alt=37000, **kwargs):
+    return Aircraft(env.traffic, call_sign, "A320", FlightPhase.CRUISE, Config.CLEAN, lat, long, alt, heading, cas,
+                    10000.0, 12000.0, departure_airport="VHHH", departure_runway="RW07L", cruise_alt=cruise_alt, **kwargs)
+
+
+@pytest.fixture()
+def env():
+    return TrafficEnv()
+
+
+def test_deleted_aircraft_handle_raises(env):
+    a = add_aircraft(env, "A", alt=10000.0)
+    b = add_aircraft(env, "B", alt=20000.0)
+    c = add_aircraft(env, "C", alt=30000.0)
+    env.traffic.del_aircraft(a.index)
+    with pytest.raises(KeyError):
+        a.get_alt()
+    with pytest.raises(KeyError):
+        a.set_heading(10.0)
+    env.traffic.flush_commands()
+    assert b.get_alt() == 20000.0 and c.get_alt() == 30000.0
+    assert env.traffic.ap.heading.tolist() == [175.0, 175.0]
+
+
+def test_capacity_grows_and_keeps_rows(env):
+    ap = env.traffic.ap
+    for k in range(5):
+        add_aircraft(env, str(k), lat=22.0 + k, heading=10.0 * k)
+    assert ap._capacity >= 5 and len(ap.heading) == 5
+    assert ap.heading.tolist() == [0.0, 10.0, 20.0, 30.0, 40.0]
+    assert env.traffic.lat.tolist() == [22.0, 23.0, 24.0, 25.0, 26.0]
+
+
+def test_delete_middle_row_shifts_following_rows(env):
+    ap = env.traffic.ap
+    a = add_aircraft(env, "A", heading=10.0, flight_plan=["BETTY"])
+    b = add_aircraft(env, "B", heading=20.0, flight_plan=["SIERA", "BETTY"])
+    c = add_aircraft(env, "C", heading=30.0, flight_plan=["SIERA", "BETTY", "CANTO"])
+    fp_lat_c = ap.flight_plan_lat[2].copy()
+    env.traffic.del_aircraft(b.index)
+    assert env.traffic.call_sign.tolist() == ["A", "C"]
+    assert ap.heading.tolist() == [10.0, 30.0]
+    assert ap.flight_plan_name[1] == ["VHHH RW07L", "SIERA", "BETTY", "CANTO"]
+    assert ap.flight_plan_len.tolist() == [2, 4]
+    np.testing.assert_array_equal(ap.flight_plan_lat[1], fp_lat_c)
+    assert a._row() == 0 and c._row() == 1
+    assert c.get_heading() == 30.0
+
+
+def test_flight_plan_widens_past_current_width(env):
+    ap = env.traffic.ap
+    a = add_aircraft(env, "A", flight_plan=["BETTY"])
+    add_aircraft(env, "B", flight_plan=["SIERA", "BETTY"])
+    fp_lat_b = ap.flight_plan_lat[1, :3].copy()
+    width = ap.flight_plan_lat.shape[1]
+    a.set_flight_plan(flight_plan=["SIERA", "BETTY", "CANTO", "SIERA", "BETTY"])
+    assert ap.flight_plan_lat.shape[1] > width
+    assert ap.flight_plan_len.tolist() == [6, 3]
+    assert not np.isnan(ap.flight_plan_lat[0, :6]).any()
+    np.testing.assert_array_equal(ap.flight_plan_lat[1, :3], fp_lat_b)
+    assert np.isnan(ap.flight_plan_lat[1, 3:]).all() and np.isnan(ap.flight_plan_target_speed[1, 3:]).all()
+
+
+
+def test_flight_plan_without_cruise_alt_has_no_altitude_target(env):
+    ap = env.traffic.ap
+    add_aircraft(env, "A", cruise_alt=-1, flight_plan=["SIERA", "BETTY", "CANTO"])
+    assert ap.flight_plan_len[0] == 4
+    assert np.isnan(ap.flight_plan_target_alt[0, 1:4]).all()
+    env.step()
+    assert ap.alt[0] == 20000.0
+
+def test_insert_waypoint_at_and_after_flight_plan_index(env):
+    ap = env.traffic.ap
+    add_aircraft(env, "A", flight_plan=["SIERA", "BETTY"])
+    add_aircraft(env, "B", flight_plan=["SIERA", "BETTY"])
+    lat = ap.flight_plan_lat[0, :3].tolist()
+    i = ap.flight_plan_index[0]
+    assert i == 1 and ap.flight_plan_index[1] == 1
+
+    # At flight_plan_index: the new waypoint becomes the next waypoint
+    ap.insert_waypoint(0, i, "VECT", 21.0, 115.0, 9000.0, 200.0)
+    assert ap.flight_plan_name[0] == ["VHHH RW07L", "VECT", "SIERA", "BETTY"]
+    assert ap.flight_plan_lat[0, :4].tolist() == [lat[0], 21.0, lat[1], lat[2]]
+    assert ap.flight_plan_target_speed[0, i] == 200.0
+    assert ap._flight_plan_name_index[0]["SIERA"] == 2
+
+    # After flight_plan_index: the next waypoint is unchanged
+    ap.insert_waypoint(1, i + 1, "VECT", 21.0, 115.0, 9000.0, 200.0)
+    assert ap.flight_plan_name[1] == ["VHHH RW07L", "SIERA", "VECT", "BETTY"]
+    assert ap.flight_plan_lat[1, :4].tolist() == [lat[0], lat[1], 21.0, lat[2]]
+    assert ap.flight_plan_len.tolist() == [4, 4]
+    assert ap._flight_plan_name_index[1]["BETTY"] == 3
+
+
+def test_queued_setter_visible_before_flush(env):
+    traffic = env.traffic
+    a = add_aircraft(env, "A")
+    a.set_heading(90.0)
+    assert traffic.get_command(('ap', 'heading'), 0) == 90.0
+    assert traffic.ap.heading[0] == 175.0
+    traffic.flush_commands()
+    assert traffic.ap.heading[0] == 90.0 and not traffic._pending
+
+
+def test_holding_entry_and_exit(env):
+    ap = env.traffic.ap
+    a = add_aircraft(env, "A", lat=22.0, long=114.2, cas=280.0, flight_plan=["BETTY", "CANTO"])
+    a.set_holding(1, "CANTO", "VH")
+    assert ap.holding_course[0] == 48.0
+
+    # Enter the hold after passing CANTO, flying back to it on heading
+    for _ in range(1500):
+        env.step()
+        if ap.holding[0]:
+            break
+    assert ap.holding[0] and ap.lateral_mode[0] == APLateralMode.HEADING
+    assert ap.flight_plan_name[0][ap.flight_plan_index[0]] == "CANTO"
+
+    # Leave the hold after one round and resume LNAV to CANTO
+    for _ in range(1500):
+        env.step()
+        if not ap.holding[0]:
+            break
+    assert not ap.holding[0] and ap.lateral_mode[0] == APLateralMode.LNAV
+    assert np.isnan(ap.holding_course[0]) and ap.holding_info[0] == []
+    assert ap.flight_plan_name[0][ap.flight_plan_index[0]] == "CANTO"
+
+
+def test_flight_plan_without_cruise_alt_holds_altitude(env):
+    a = add_aircraft(env, "A", lat=22.3, cas=280.0, cruise_alt=-1, flight_plan=["SIERA", "BETTY", "CANTO"])
+    add_aircraft(env, "B", cas=280.0, cruise_alt=-1, flight_plan=["BETTY"])
+    for _ in range(300):
+        env.step()
+    assert env.traffic.ap.alt.tolist() == [20000.0, 20000.0]
+    assert env.traffic.alt.tolist() == [20000.0, 20000.0]
+    assert a.get_next_wp() in ("SIERA", "BETTY", "CANTO")
+
+
+def test_set_alt_after_flight_plan_is_exhausted(env):
+    ap = env.traffic.ap
+    a = add_aircraft(env, "A", flight_plan=["BETTY"])
+    add_aircraft(env, "B", flight_plan=["SIERA", "BETTY", "CANTO"])
+    ap.flight_plan_index[0] = ap.flight_plan_len[0]
+    a.set_alt(15000.0)
+    assert ap.alt[0] == 15000.0
+    assert np.isnan(ap.flight_plan_target_alt[0, ap.flight_plan_len[0]:]).all()
+    ap.insert_waypoint(0, 2, "VECT", 21.0, 115.0, 9000.0, 200.0)
+    assert ap.flight_plan_target_alt[0, 2] == 9000.0 and np.isnan(ap.flight_plan_target_alt[0, 3:]).all()